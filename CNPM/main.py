@@ -1,7 +1,8 @@
 # main.py
+import threading
 import tkinter as tk
 from tkinter import ttk
-from typing import Optional, Dict
+from typing import Optional, Dict, Any
 
 from models import DataStore, User
 # Import toàn bộ các Frame từ ui
@@ -28,37 +29,83 @@ class App(tk.Tk):
         self.container.columnconfigure(0, weight=1)
 
         self.frames: Dict[str, ttk.Frame] = {}
+        self._reload_job: Optional[str] = None
         self._init_frames()
         self.show_frame("LoginFrame")
 
     def _init_frames(self):
-        # Đăng ký tất cả các Frame
-        for F in (
-            LoginFrame, AdminFrame, TeacherFrame, StudentFrame,
-            ExamTakeFrame, ReviewFrame, TeacherAttemptFrame,
-            TemplatePreviewFrame, ExamPreviewFrame
-        ):
+        # Đăng ký các lớp Frame; Frame chỉ được tạo khi cần đến lần đầu
+        self._frame_classes = {
+            F.__name__: F for F in (
+                LoginFrame, AdminFrame, TeacherFrame, StudentFrame,
+                ExamTakeFrame, ReviewFrame, TeacherAttemptFrame,
+                TemplatePreviewFrame, ExamPreviewFrame
+            )
+        }
+
+    def get_frame(self, name: str) -> ttk.Frame:
+        frame = self.frames.get(name)
+        if frame is None:
             # Truyền self (app) vào Frame để các Frame truy cập store
-            frame = F(self.container, self)
-            self.frames[F.__name__] = frame
+            frame = self._frame_classes[name](self.container, self)
+            self.frames[name] = frame
             frame.grid(row=0, column=0, sticky="nsew")
+        return frame
 
     def show_frame(self, name: str):
         self.current_frame_name = name
-        frame = self.frames[name]
-        if hasattr(frame, "on_show"):
-            frame.on_show()
+        frame = self.get_frame(name)
+        on_show = getattr(frame, "on_show", None)
+        if on_show is not None:
+            on_show()
         frame.tkraise()
 
     def reload_data(self):
-        self.store.load()
+        # Bấm Reload liên tục chỉ đọc file một lần: hủy lần hẹn trước, hẹn lại sau 100ms
+        if self._reload_job is not None:
+            self.after_cancel(self._reload_job)
+        self._reload_job = self.after(100, self._start_reload)
+
+    def _start_reload(self):
+        self._reload_job = None
+        # Đọc file ở luồng phụ để không treo giao diện, kết quả áp dụng trên luồng Tk
+        # Ghi nhớ số lần save lúc bắt đầu đọc: nếu có save trong lúc đọc thì bản đọc được đã cũ
+        result: Dict[str, Any] = {"save_count": self.store.save_count}
+        worker = threading.Thread(target=self._read_disk_into, args=(result,), daemon=True)
+        worker.start()
+        self._poll_reload(worker, result)
+
+    def _read_disk_into(self, result: Dict[str, Any]):
+        try:
+            result["data"] = self.store.read_disk()
+        except Exception:
+            # File đang bị ghi dở hoặc hỏng: giữ nguyên dữ liệu hiện tại, không seed lại
+            result["failed"] = True
+
+    def _poll_reload(self, worker: threading.Thread, result: Dict[str, Any]):
+        if worker.is_alive():
+            self.after(20, self._poll_reload, worker, result)
+            return
+        if result.get("failed"):
+            return
+        if result["save_count"] != self.store.save_count:
+            # Bản đọc được cũ hơn dữ liệu vừa save: bỏ đi và đọc lại
+            self.reload_data()
+            return
+        self._finish_reload(result.get("data"))
+
+    def _finish_reload(self, data: Optional[Dict[str, Any]]):
+        self.store.apply_loaded(data)
+        for name in ("TemplatePreviewFrame", "ExamPreviewFrame"):
+            if name in self.frames:
+                self.frames[name].clear_cache()
         if self.current_user:
             u = self.store.find_user(self.current_user.username)
             if u:
                 self.current_user = u
-        cur = self.frames.get(self.current_frame_name)
-        if cur and hasattr(cur, "on_show"):
-            cur.on_show()
+        on_show = getattr(self.frames.get(self.current_frame_name), "on_show", None)
+        if on_show is not None:
+            on_show()
 
     def logout(self):
         # Dừng timer nếu đang thi
@@ -1,6 +1,7 @@
 # models.py
 import json
 import os
+import tempfile
 import time
 import secrets
 import string
@@ -14,7 +15,8 @@ ROLE_CANON = {"admin": "Admin", "teacher": "Teacher", "student": "Student"}
 # -----------------------------
 # Data Models
 # -----------------------------
-@dataclass
+# slots=True: no per-instance __dict__ (lists of attempts/exams are rebuilt on every refresh)
+@dataclass(slots=True)
 class User:
     username: str
     password: str
@@ -23,20 +25,20 @@ class User:
     dob: str = ""         # YYYY-MM-DD
     student_id: str = ""  # for students
 
-@dataclass
+@dataclass(slots=True)
 class Question:
     text: str
     options: List[str]              # 4 options
     correct_indices: List[int]      # can be multiple
 
-@dataclass
+@dataclass(slots=True)
 class Template:
     template_id: str
     title: str
     created_by: str
     questions: List[Question]
 
-@dataclass
+@dataclass(slots=True)
 class Exam:
     exam_id: str
     template_id: str
@@ -51,7 +53,7 @@ class Exam:
     end_ts: int
     questions: List[Question]
 
-@dataclass
+@dataclass(slots=True)
 class Attempt:
     attempt_id: str
     exam_id: str
@@ -87,6 +89,22 @@ def score_question_partial(user_sel: Set[int], correct: Set[int], points: float)
     extra = user_sel - correct
     return earned, missing, extra
 
+def to_mask(indices) -> int:
+    """Option indices -> bitmask (bit i = option i)."""
+    m = 0
+    for i in indices:
+        m |= 1 << int(i)
+    return m
+
+def score_mask_partial(sel_mask: int, correct_mask: int, points: float) -> float:
+    """Same rule as score_question_partial on option bitmasks, without building set diffs."""
+    k = correct_mask.bit_count()
+    if not k:
+        return 0.0
+    c = (sel_mask & correct_mask).bit_count()
+    w = (sel_mask & ~correct_mask).bit_count()
+    return max(0.0, min(1.0, (c - w) / k)) * points
+
 # -----------------------------
 # Storage & Migrations
 # -----------------------------
@@ -94,30 +112,55 @@ class DataStore:
     def __init__(self, path: str = DATA_FILE):
         self.path = path
         self.data: Dict[str, Any] = {"users": [], "templates": [], "exams": [], "attempts": []}
+        # (kind, teacher) -> built Template/Exam list; dropped whenever templates/exams change
+        self._by_teacher: Dict[Tuple[str, str], list] = {}
+        # bumped on every attempts change so screens can tell whether their attempt lists are stale
+        self.attempts_version = 0
+        # bumped on every save(), so a reload read off the Tk thread can tell it is already stale
+        self.save_count = 0
         self.load()
 
     def load(self):
-        if not os.path.exists(self.path):
-            self._seed_default()
-            self.save()
-            return
-
         try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                raw = json.load(f)
+            data = self.read_disk()
         except Exception:
+            data = None  # unreadable at startup: fall back to the defaults as before
+        self.apply_loaded(data)
+        if data is not None:
+            self.save()  # write back the migrated data, as the startup load always did
+
+    def apply_loaded(self, data: Optional[Dict[str, Any]]):
+        """Install data returned by read_disk. None seeds the defaults and saves them;
+        data read from disk is not written back."""
+        if data is None:
             self._seed_default()
+        else:
+            self.data = data
+        self._by_teacher.clear()
+        self.attempts_version += 1
+        if data is None:
             self.save()
-            return
 
-        self.data = raw if isinstance(raw, dict) else {}
-        self.data.setdefault("users", [])
-        self.data.setdefault("templates", [])
-        self.data.setdefault("exams", [])
-        self.data.setdefault("attempts", [])
+    def read_disk(self) -> Optional[Dict[str, Any]]:
+        """
+        Read + migrate the data file without touching self.data,
+        so it can run off the UI thread. None if the file is missing;
+        read/parse errors are raised so a reload can keep the current data.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+
+        data = raw if isinstance(raw, dict) else {}
+        data.setdefault("users", [])
+        data.setdefault("templates", [])
+        data.setdefault("exams", [])
+        data.setdefault("attempts", [])
 
         # Migration logic
-        for u in self.data["users"]:
+        for u in data["users"]:
             u.setdefault("full_name", "")
             u.setdefault("dob", "")
             u.setdefault("student_id", "")
@@ -127,14 +170,14 @@ class DataStore:
                 role_norm = "Student"
             u["role"] = role_norm
 
-        for t in self.data["templates"]:
+        for t in data["templates"]:
             t.setdefault("questions", [])
             for qu in t.get("questions", []):
                 if "correct_indices" not in qu and "correct_index" in qu:
                     qu["correct_indices"] = [int(qu.get("correct_index", 0))]
                 qu.pop("correct_index", None)
 
-        for e in self.data["exams"]:
+        for e in data["exams"]:
             e.setdefault("attempt_limit", 0)
             e.setdefault("allow_review", False)
             e.setdefault("password", "")
@@ -147,18 +190,29 @@ class DataStore:
                     qu["correct_indices"] = [int(qu.get("correct_index", 0))]
                 qu.pop("correct_index", None)
 
-        for a in self.data["attempts"]:
+        for a in data["attempts"]:
             try:
                 a["score"] = float(a.get("score", 0))
             except Exception:
                 a["score"] = 0.0
             a.setdefault("answers", [])
 
-        self.save()
+        return data
 
     def save(self):
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        self.save_count += 1
+        # Write a temp file next to the data file and swap it in, so a reader never sees half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
 
     def _seed_default(self):
         self.data = {
@@ -236,6 +290,7 @@ class DataStore:
     # ---- Templates ----
     def add_template(self, t: Template):
         self.data["templates"].append(self._template_to_dict(t))
+        self._by_teacher.clear()
         self.save()
 
     def update_template(self, t: Template) -> bool:
@@ -243,6 +298,7 @@ class DataStore:
         for i, existing in enumerate(self.data["templates"]):
             if existing.get("template_id") == t.template_id:
                 self.data["templates"][i] = self._template_to_dict(t)
+                self._by_teacher.clear()
                 self.save()
                 return True
         return False
@@ -251,7 +307,12 @@ class DataStore:
         return [self._dict_to_template(x) for x in self.data["templates"]]
 
     def list_templates_by_teacher(self, teacher: str) -> List[Template]:
-        return [t for t in self.list_templates() if t.created_by == teacher]
+        key = ("templates", teacher)
+        if key not in self._by_teacher:
+            self._by_teacher[key] = [
+                self._dict_to_template(x) for x in self.data["templates"] if x.get("created_by") == teacher
+            ]
+        return list(self._by_teacher[key])
 
     def get_template(self, template_id: str) -> Optional[Template]:
         for t in self.data["templates"]:
@@ -264,6 +325,7 @@ class DataStore:
         self.data["templates"] = [t for t in self.data["templates"] if t.get("template_id") != template_id]
         if len(self.data["templates"]) == before:
             return False
+        self._by_teacher.clear()
         self.save()
         return True
 
@@ -292,13 +354,19 @@ class DataStore:
     # ---- Exams ----
     def add_exam(self, e: Exam):
         self.data["exams"].append(self._exam_to_dict(e))
+        self._by_teacher.clear()
         self.save()
 
     def list_exams(self) -> List[Exam]:
         return [self._dict_to_exam(x) for x in self.data["exams"]]
 
     def list_exams_by_teacher(self, teacher: str) -> List[Exam]:
-        return [e for e in self.list_exams() if e.created_by == teacher]
+        key = ("exams", teacher)
+        if key not in self._by_teacher:
+            self._by_teacher[key] = [
+                self._dict_to_exam(x) for x in self.data["exams"] if x.get("created_by") == teacher
+            ]
+        return list(self._by_teacher[key])
 
     def get_exam_by_code(self, code: str) -> Optional[Exam]:
         code = (code or "").strip().upper()
@@ -318,6 +386,7 @@ class DataStore:
         self.data["exams"] = [e for e in self.data["exams"] if e.get("exam_id") != exam_id]
         if len(self.data["exams"]) == before:
             return False
+        self._by_teacher.clear()
         self.save()
         return True
 
@@ -359,6 +428,7 @@ class DataStore:
     # ---- Attempts ----
     def add_attempt(self, a: Attempt):
         self.data["attempts"].append(asdict(a))
+        self.attempts_version += 1
         self.save()
 
     def list_attempts_for_user(self, username: str) -> List[Attempt]:
@@ -379,5 +449,6 @@ class DataStore:
         self.data["attempts"] = [a for a in self.data["attempts"] if a.get("exam_id") != exam_id]
         deleted = before - len(self.data["attempts"])
         if deleted:
+            self.attempts_version += 1
             self.save()
         return deleted
\ No newline at end of file
@@ -1,13 +1,14 @@
 # ui.py
+import functools
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 import time
-from typing import Optional, List, Dict, Set
+from typing import Optional, List, Dict, Set, Tuple
 
 # Import models
 from models import (
     User, Exam, Template, Question, Attempt,
-    ROLES, ROLE_CANON, score_question_partial
+    ROLES, ROLE_CANON, to_mask, score_mask_partial
 )
 # Import utils
 import utils
@@ -21,6 +22,48 @@ def info(msg: str):
 def err(msg: str):
     messagebox.showerror("Error", msg)
 
+class ConfirmDialog(tk.Toplevel):
+    """Yes/No dialog driven by callbacks, so the Tk event loop (timers) keeps running."""
+    def __init__(self, parent, title: str, msg: str, on_yes=None, on_no=None):
+        super().__init__(parent)
+        self.on_yes_cb = on_yes
+        self.on_no_cb = on_no
+        self.title(title)
+        self.resizable(False, False)
+        self.transient(parent.winfo_toplevel())
+        ttk.Label(self, text=msg, padding=16, justify="left").pack()
+        btns = ttk.Frame(self, padding=(16, 0, 16, 12))
+        btns.pack()
+        ttk.Button(btns, text="Yes", command=self.on_yes).pack(side="left", padx=6)
+        ttk.Button(btns, text="No", command=self.on_no).pack(side="left", padx=6)
+        self.protocol("WM_DELETE_WINDOW", self.on_no)
+        # A grab on an unmapped window fails on X11 ("window not viewable"), so wait until it is shown
+        try:
+            self.wait_visibility()
+            self.grab_set()
+        except tk.TclError:
+            pass
+
+    def on_yes(self):
+        self.destroy()
+        if self.on_yes_cb: self.on_yes_cb()
+
+    def on_no(self):
+        self.destroy()
+        if self.on_no_cb: self.on_no_cb()
+
+def _question_blocks(questions: List[Question]) -> List[str]:
+    """One preview block per question: text + options, correct ones marked."""
+    blocks = []
+    for i, q in enumerate(questions):
+        correct = set(q.correct_indices)
+        lines = [f"Q{i+1}: {q.text}\n"]
+        for oi, opt in enumerate(q.options):
+            mark = " (correct)" if oi in correct else ""
+            lines.append(f"  {oi+1}. {opt}{mark}\n")
+        blocks.append("".join(lines))
+    return blocks
+
 class Header(ttk.Frame):
     def __init__(self, parent, title: str, subtitle: str = ""):
         super().__init__(parent)
@@ -166,8 +209,10 @@ class AdminFrame(ttk.Frame):
 
     def refresh_users(self):
         self.users_box.delete(0, tk.END)
-        for u in self.app.store.list_users():
-            self.users_box.insert(tk.END, f"{u.username} | {u.role} | {u.full_name} | {u.dob} | {u.student_id}")
+        self.users_box.insert(tk.END, *[
+            f"{u.username} | {u.role} | {u.full_name} | {u.dob} | {u.student_id}"
+            for u in self.app.store.list_users()
+        ])
 
     def create_user(self):
         username = self.new_user.get().strip()
@@ -202,6 +247,10 @@ class AdminFrame(ttk.Frame):
         self.refresh_users()
 
 
+# Exam status by (start <= now) + (end < now); publish_exam guarantees start < end
+_EXAM_STATUS = ("WAIT", "OPEN", "CLOSED")
+
+
 class TeacherFrame(ttk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent)
@@ -240,6 +289,15 @@ class TeacherFrame(ttk.Frame):
         self.opt_vars = [tk.StringVar() for _ in range(4)]
         self.correct_vars = [tk.BooleanVar(value=False) for _ in range(4)]
         self._temp_questions: List[Question] = []
+        self._q_labels: Dict[int, Tuple[Question, str]] = {}  # id(question) -> (question, row label)
+        # Set by any builder edit; an Update with nothing changed skips the store rewrite
+        self._builder_dirty = False
+        self.tpl_title.trace_add("write", self._mark_builder_dirty)
+        # One Tcl script resets the 9 question-form variables (instead of 9 separate .set calls)
+        self._clear_q_script = "; ".join(
+            [f"set {v} {{}}" for v in [self.q_text, *self.opt_vars]]
+            + [f"set {b} 0" for b in self.correct_vars]
+        )
 
         # Template Title
         bf = ttk.Frame(left, padding=10)
@@ -284,7 +342,7 @@ class TeacherFrame(ttk.Frame):
         # Questions List
         self.temp_list = tk.Listbox(left, height=10)
         self.temp_list.pack(fill="both", expand=True, padx=10, pady=(0, 10))
-        self.temp_list.bind("<Double-Button-1>", lambda e: self.load_question_for_editing())
+        self.temp_list.bind("<Double-Button-1>", self.load_question_for_editing)
 
 
         # ================= RIGHT PANEL UI =================
@@ -308,8 +366,9 @@ class TeacherFrame(ttk.Frame):
         pub = ttk.LabelFrame(rf, text="Publish Exam")
         pub.pack(fill="x", pady=(0, 8))
 
-        self.pub_start = tk.StringVar(value=time.strftime("%Y-%m-%d 08:00", time.localtime()))
-        self.pub_end = tk.StringVar(value=time.strftime("%Y-%m-%d 23:00", time.localtime()))
+        today = time.strftime("%Y-%m-%d", time.localtime())
+        self.pub_start = tk.StringVar(value=f"{today} 08:00")
+        self.pub_end = tk.StringVar(value=f"{today} 23:00")
         self.pub_duration = tk.IntVar(value=30)
         self.pub_use_pass = tk.BooleanVar(value=False)
         self.pub_pass = tk.StringVar()
@@ -359,13 +418,18 @@ class TeacherFrame(ttk.Frame):
         ttk.Label(rf, text="Student Attempts (Double click to view):").pack(anchor="w", pady=(8, 0))
         self.attempt_list = tk.Listbox(rf, height=9, exportselection=False)
         self.attempt_list.pack(fill="both", expand=True, pady=(6, 0))
-        self.attempt_list.bind("<Double-Button-1>", lambda e: self.view_attempt_details())
+        self.attempt_list.bind("<Double-Button-1>", self.view_attempt_details)
         
         self.selected_attempt_id: str = ""
         self.attempt_list.bind("<<ListboxSelect>>", self._on_attempt_select)
         self.attempt_list.bind("<Button-1>", self._on_attempt_click)
 
         self._attempt_id_by_index: Dict[int, str] = {}
+        # attempts of the selected exam, kept from _on_exam_select so opening one needs no store call
+        self._attempts_by_id: Dict[str, Attempt] = {}
+        # ids in Listbox row order, so a selection maps to an id without reading/splitting the row text
+        self._tpl_ids: List[str] = []
+        self._exam_ids: List[str] = []
         self._toggle_pub_pass()
 
     def _toggle_pub_pass(self):
@@ -376,7 +440,8 @@ class TeacherFrame(ttk.Frame):
             self.pub_pass.set("")
 
     def on_show(self):
-        if not self.app.current_user or self.app.current_user.role != "Teacher":
+        user = self.app.current_user
+        if not user or user.role != "Teacher":
             err("Teacher role required.")
             self.app.logout()
             return
@@ -384,32 +449,47 @@ class TeacherFrame(ttk.Frame):
         self.refresh_exams()
         self.attempt_list.delete(0, tk.END)
         self._attempt_id_by_index.clear()
+        self._attempts_by_id.clear()
         self.clear_builder() 
 
     def refresh_templates(self):
+        templates = self.app.store.list_templates_by_teacher(self.app.current_user.username)
         self.tpl_list.delete(0, tk.END)
-        teacher = self.app.current_user.username
-        for t in self.app.store.list_templates_by_teacher(teacher):
-            self.tpl_list.insert(tk.END, f"{t.template_id} | {t.title} | {len(t.questions)} Qs")
+        self._tpl_ids = [t.template_id for t in templates]
+        # One Listbox insert for the whole list instead of one Tcl call per row
+        self.tpl_list.insert(tk.END, *[
+            f"{t.template_id} | {t.title} | {len(t.questions)} Qs" for t in templates
+        ])
 
     def refresh_exams(self):
+        exams = self.app.store.list_exams_by_teacher(self.app.current_user.username)
         self.exam_list.delete(0, tk.END)
-        teacher = self.app.current_user.username
+        self._exam_ids = [e.exam_id for e in exams]
         now = int(time.time())
-        for e in self.app.store.list_exams_by_teacher(teacher):
-            status = "OPEN" if (e.start_ts <= now <= e.end_ts) else ("WAIT" if now < e.start_ts else "CLOSED")
-            self.exam_list.insert(
-                tk.END,
-                f"{e.exam_id} | {e.title} | Code: {e.access_code} | {status}"
-            )
+        rows = []
+        for e in exams:
+            status = _EXAM_STATUS[(e.start_ts <= now) + (e.end_ts < now)]
+            rows.append(f"{e.exam_id} | {e.title} | Code: {e.access_code} | {status}")
+        self.exam_list.insert(tk.END, *rows)
 
     # ================= LOGIC BUILDER =================
 
     def refresh_builder_list(self):
+        # The builder replaces whole Question objects and never edits one in place,
+        # so its row text (minus the number) is formatted once per object;
+        # the cache is rebuilt from the current list so removed questions drop out
+        old = self._q_labels
+        labels: Dict[int, Tuple[Question, str]] = {}
+        rows = []
+        for i, q in enumerate(self._temp_questions, start=1):
+            hit = old.get(id(q))
+            if hit is None or hit[0] is not q:
+                hit = (q, f"{q.text} (Correct: {','.join(str(x+1) for x in q.correct_indices)})")
+            labels[id(q)] = hit
+            rows.append(f"{i}. {hit[1]}")
+        self._q_labels = labels
         self.temp_list.delete(0, tk.END)
-        for i, q in enumerate(self._temp_questions):
-            correct_str = ",".join(str(x+1) for x in q.correct_indices)
-            self.temp_list.insert(tk.END, f"{i+1}. {q.text} (Correct: {correct_str})")
+        self.temp_list.insert(tk.END, *rows)
 
     def add_or_update_question(self):
         text = self.q_text.get().strip()
@@ -432,17 +512,22 @@ class TeacherFrame(ttk.Frame):
         else:
             # ADD NEW
             self._temp_questions.append(q)
+        self._builder_dirty = True
 
         self.refresh_builder_list()
         
         # Clear small form but keep title
-        self.q_text.set("")
-        for v in self.opt_vars: v.set("")
-        for b in self.correct_vars: b.set(False)
+        self._clear_question_form()
         self.editing_question_index = None
         self.btn_add_q.config(text="Add Question")
 
-    def load_question_for_editing(self):
+    def _mark_builder_dirty(self, *_):
+        self._builder_dirty = True
+
+    def _clear_question_form(self):
+        self.tk.eval(self._clear_q_script)
+
+    def load_question_for_editing(self, event=None):
         """Loads selected question back into the inputs for editing"""
         sel = self.temp_list.curselection()
         if not sel: return
@@ -468,15 +553,14 @@ class TeacherFrame(ttk.Frame):
         if not sel: return
         idx = sel[0]
         self._temp_questions.pop(idx)
+        self._builder_dirty = True
         self.refresh_builder_list()
         
         # If we were editing this specific question, cancel edit mode
         if self.editing_question_index == idx:
             self.editing_question_index = None
             self.btn_add_q.config(text="Add Question")
-            self.q_text.set("")
-            for v in self.opt_vars: v.set("")
-            for b in self.correct_vars: b.set(False)
+            self._clear_question_form()
 
     def edit_selected_template(self):
         """Load template from right list to left builder"""
@@ -490,6 +574,7 @@ class TeacherFrame(ttk.Frame):
         
         self.tpl_title.set(t.title)
         self._temp_questions = list(t.questions) 
+        self._builder_dirty = False
         self.refresh_builder_list()
         
         self.btn_save.config(text=f"Update ({t.template_id})")
@@ -500,11 +585,10 @@ class TeacherFrame(ttk.Frame):
         self.editing_question_index = None
         
         self.tpl_title.set("")
-        self.q_text.set("")
-        for v in self.opt_vars: v.set("")
-        for b in self.correct_vars: b.set(False)
+        self._clear_question_form()
         
         self._temp_questions.clear()
+        self._builder_dirty = False
         self.temp_list.delete(0, tk.END)
         
         self.btn_save.config(text="Save New Template")
@@ -517,6 +601,7 @@ class TeacherFrame(ttk.Frame):
         
         if self.editing_template_id:
             # === UPDATE MODE ===
+            if not self._builder_dirty: return info("No changes to save.")
             if not messagebox.askyesno("Confirm", "Overwrite this template?"): return
             t = Template(
                 template_id=self.editing_template_id,
@@ -525,6 +610,8 @@ class TeacherFrame(ttk.Frame):
                 questions=list(self._temp_questions)
             )
             if self.app.store.update_template(t):
+                preview = self.app.frames.get("TemplatePreviewFrame")
+                if preview: preview.drop_cached(t.template_id)
                 info("Template updated successfully.")
             else:
                 err("Error: Template ID not found.")
@@ -546,13 +633,13 @@ class TeacherFrame(ttk.Frame):
 
     def _selected_template_id(self) -> Optional[str]:
         sel = self.tpl_list.curselection()
-        if not sel: return None
-        return self.tpl_list.get(sel[0]).split("|")[0].strip()
+        if not sel or sel[0] >= len(self._tpl_ids): return None
+        return self._tpl_ids[sel[0]]
 
     def _selected_exam_id(self) -> Optional[str]:
         sel = self.exam_list.curselection()
-        if not sel: return None
-        return self.exam_list.get(sel[0]).split("|")[0].strip()
+        if not sel or sel[0] >= len(self._exam_ids): return None
+        return self._exam_ids[sel[0]]
 
     def delete_selected_template(self):
         tid = self._selected_template_id()
@@ -569,7 +656,7 @@ class TeacherFrame(ttk.Frame):
     def preview_selected_template(self):
         tid = self._selected_template_id()
         if not tid: return err("Select a template.")
-        self.app.frames["TemplatePreviewFrame"].load_template(tid, back_to="TeacherFrame")
+        self.app.get_frame("TemplatePreviewFrame").load_template(tid, back_to="TeacherFrame")
         self.app.show_frame("TemplatePreviewFrame")
 
     def export_selected_template_word(self):
@@ -585,7 +672,8 @@ class TeacherFrame(ttk.Frame):
     def publish_exam(self):
         tid = self._selected_template_id()
         if not tid: return err("Select a template to publish.")
-        tpl = self.app.store.get_template(tid)
+        store = self.app.store
+        tpl = store.get_template(tid)
         
         start_ts = utils.parse_dt(self.pub_start.get())
         end_ts = utils.parse_dt(self.pub_end.get())
@@ -593,10 +681,10 @@ class TeacherFrame(ttk.Frame):
         if end_ts <= start_ts: return err("End time must be after Start time.")
         
         dur_min = int(self.pub_duration.get())
-        code = self.app.store.new_unique_code(8)
+        code = store.new_unique_code(8)
         
         e = Exam(
-            exam_id=self.app.store.new_exam_id(),
+            exam_id=store.new_exam_id(),
             template_id=tpl.template_id,
             title=tpl.title,
             created_by=self.app.current_user.username,
@@ -609,14 +697,14 @@ class TeacherFrame(ttk.Frame):
             end_ts=int(end_ts),
             questions=list(tpl.questions)
         )
-        self.app.store.add_exam(e)
+        store.add_exam(e)
         info(f"Exam Published!\nCODE: {code}")
         self.refresh_exams()
 
     def preview_selected_exam(self):
         eid = self._selected_exam_id()
         if not eid: return err("Select an exam.")
-        self.app.frames["ExamPreviewFrame"].load_exam(eid, back_to="TeacherFrame")
+        self.app.get_frame("ExamPreviewFrame").load_exam(eid, back_to="TeacherFrame")
         self.app.show_frame("ExamPreviewFrame")
 
     def delete_selected_exam(self):
@@ -627,6 +715,7 @@ class TeacherFrame(ttk.Frame):
             info("Deleted.")
             self.refresh_exams()
             self.attempt_list.delete(0, tk.END)
+            self._attempts_by_id.clear()
 
     def delete_attempts_for_selected_exam(self):
         eid = self._selected_exam_id()
@@ -651,33 +740,36 @@ class TeacherFrame(ttk.Frame):
         self.selected_exam_id = eid
         self.attempt_list.delete(0, tk.END)
         self._attempt_id_by_index.clear()
+        self._attempts_by_id.clear()
         if not eid: return
 
         attempts = self.app.store.list_attempts_for_exam(eid)
+        self._attempts_by_id = {a.attempt_id: a for a in attempts}
         if not attempts:
             self.attempt_list.insert(tk.END, "(No attempts)")
             return
 
+        rows = []
         for idx, a in enumerate(attempts):
-            took = f"{a.time_taken_seconds // 60:02d}:{a.time_taken_seconds % 60:02d}"
             score10 = (a.score / max(1, a.total)) * 10.0
-            self.attempt_list.insert(tk.END, f"{a.full_name} | {score10:.2f}/10 | {took}")
+            mm, ss = divmod(a.time_taken_seconds, 60)
+            rows.append(f"{a.full_name} | {score10:.2f}/10 | {mm:02d}:{ss:02d}")
             self._attempt_id_by_index[idx] = a.attempt_id
+        self.attempt_list.insert(tk.END, *rows)
 
     def _selected_attempt_id_from_listbox(self) -> str:
         sel = self.attempt_list.curselection()
         if not sel: return ""
         return self._attempt_id_by_index.get(sel[0], "")
 
-    def view_attempt_details(self):
+    def view_attempt_details(self, event=None):
         eid = self.selected_exam_id
         aid = self._selected_attempt_id_from_listbox()
         if not eid or not aid: return
-        
-        attempts = self.app.store.list_attempts_for_exam(eid)
-        target = next((x for x in attempts if x.attempt_id == aid), None)
+
+        target = self._attempts_by_id.get(aid)
         if target:
-            self.app.frames["TeacherAttemptFrame"].load_attempt(target, back_to="TeacherFrame")
+            self.app.get_frame("TeacherAttemptFrame").load_attempt(target, back_to="TeacherFrame")
             self.app.show_frame("TeacherAttemptFrame")
 
     def _on_attempt_click(self, event):
@@ -692,6 +784,9 @@ class TeacherFrame(ttk.Frame):
 
 
 class StudentFrame(ttk.Frame):
+    # submitted | title | score10
+    _LINE_FMT = "%s | %s | %.2f/10"
+
     def __init__(self, parent, app):
         super().__init__(parent)
         self.app = app
@@ -738,17 +833,21 @@ class StudentFrame(ttk.Frame):
         self.attempt_list = tk.Listbox(right, height=16)
         self.attempt_list.pack(fill="both", expand=True, padx=10, pady=(6, 10))
         ttk.Button(right, text="Review selected attempt", command=self.review_selected).pack(pady=(0, 10))
+        self._attempts: List[Attempt] = []
+        self._attempts_key: Optional[Tuple[str, int]] = None  # (username, store.attempts_version) of _attempts
+        self._rows: List[str] = []
+        self._rows_key: Optional[Tuple[str, int]] = None
 
     def on_show(self):
-        if not self.app.current_user or self.app.current_user.role != "Student":
+        user = self.app.current_user
+        if not user or user.role != "Student":
             err("You need Student role.")
             self.app.logout()
             return
-        u = self.app.store.find_user(self.app.current_user.username)
-        if u: self.app.current_user = u
-        self.full_name.set(self.app.current_user.full_name)
-        self.dob.set(self.app.current_user.dob)
-        self.sid.set(self.app.current_user.student_id)
+        user = self.app.current_user = self.app.store.find_user(user.username) or user
+        self.full_name.set(user.full_name)
+        self.dob.set(user.dob)
+        self.sid.set(user.student_id)
         self.refresh_attempts()
 
     def update_profile(self):
@@ -761,15 +860,32 @@ class StudentFrame(ttk.Frame):
         info("Profile updated.")
         self.refresh_attempts()
 
+    def _my_attempts(self) -> List[Attempt]:
+        # Re-fetch only when the user changed or attempts were added/deleted/reloaded since last time
+        store = self.app.store
+        username = self.app.current_user.username
+        key = (username, store.attempts_version)
+        if key != self._attempts_key:
+            self._attempts = store.list_attempts_for_user(username)
+            self._attempts_key = key
+        return self._attempts
+
     def refresh_attempts(self):
         self.attempt_list.delete(0, tk.END)
-        attempts = self.app.store.list_attempts_for_user(self.app.current_user.username)
+        # Listbox rows line up with this list; review_selected reads from it instead of re-fetching
+        attempts = self._my_attempts()
         if not attempts:
             self.attempt_list.insert(tk.END, "No attempts yet.")
             return
-        for a in attempts:
-            score10 = (a.score / max(1, a.total)) * 10.0
-            self.attempt_list.insert(tk.END, f"{utils.fmt_dt_full(a.submitted_at)} | {a.title} | {score10:.2f}/10")
+        # Attempts never change once stored, so the rows are formatted once per fetched list
+        if self._rows_key != self._attempts_key:
+            fmt = self._LINE_FMT
+            self._rows = [
+                fmt % (utils.fmt_dt_full(a.submitted_at), a.title, (a.score / max(1, a.total)) * 10.0)
+                for a in attempts
+            ]
+            self._rows_key = self._attempts_key
+        self.attempt_list.insert(tk.END, *self._rows)
 
     def open_by_code(self):
         code = self.code_var.get().strip().upper()
@@ -782,40 +898,54 @@ class StudentFrame(ttk.Frame):
         if now > exam.end_ts: return err(f"Exam closed.\nEnd: {utils.fmt_dt(exam.end_ts)}")
         
         if exam.attempt_limit > 0:
-            used = self.app.store.count_attempts_for_user_exam(self.app.current_user.username, exam.exam_id)
+            used = sum(1 for a in self._my_attempts() if a.exam_id == exam.exam_id)
             if used >= exam.attempt_limit: return err("Attempt limit reached.")
 
         if exam.password:
             pw = simpledialog.askstring("Password", "This exam needs password:", show="*")
             if pw != exam.password: return err("Wrong password.")
 
-        self.app.frames["ExamTakeFrame"].load_exam(exam)
+        self.app.get_frame("ExamTakeFrame").load_exam(exam)
         self.app.show_frame("ExamTakeFrame")
 
     def review_selected(self):
         sel = self.attempt_list.curselection()
-        if not sel: return err("Select an attempt.")
-        attempts = self.app.store.list_attempts_for_user(self.app.current_user.username)
-        attempt = attempts[sel[0]]
+        if not sel or sel[0] >= len(self._attempts): return err("Select an attempt.")
+        attempt = self._attempts[sel[0]]
         exam = self.app.store.get_exam(attempt.exam_id)
         if not exam: return err("Exam data missing.")
         if not exam.allow_review: return err("Review not allowed by teacher.")
-        self.app.frames["ReviewFrame"].load_review(exam, attempt, back_to="StudentFrame")
+        self.app.get_frame("ReviewFrame").load_review(exam, attempt, back_to="StudentFrame")
         self.app.show_frame("ReviewFrame")
 
 
+# Nav button colors indexed by (current << 2) | (marked << 1) | answered
+_NAV_COLORS = [
+    ("#f0f0f0", "black"), ("#90ee90", "black"), ("orange", "black"), ("orange", "black"),
+    ("blue", "white"), ("blue", "white"), ("blue", "white"), ("blue", "white"),
+]
+# Mark button options indexed by "current question is marked"; applied only when that flips
+_MARK_BTN_CONFIG = (
+    {"text": "Mark for Review", "bg": "lightyellow", "fg": "black"},
+    {"text": "Unmark Flag", "bg": "orange", "fg": "white"},
+)
+
 class ExamTakeFrame(ttk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent)
         self.app = app
         self.exam: Optional[Exam] = None
         self.index = 0
-        self.answers: List[Set[int]] = []
+        self.answers: List[int] = []  # one option bitmask per question (bit i = option i chosen)
+        self._correct_masks: List[int] = []
         self.marked_questions: Set[int] = set()
         self.started_at: float = 0.0
         self.end_time: float = 0.0
         self._timer_job = None
         self._auto_submitted = False
+        self._render_pending = False
+        self._confirm: Optional[ConfirmDialog] = None
+        self._last_text: Dict[tk.Widget, str] = {}
 
         # Top bar
         top = ttk.Frame(self)
@@ -834,11 +964,11 @@ class ExamTakeFrame(ttk.Frame):
         self.grid_frame = ttk.Frame(self.sidebar)
         self.grid_frame.pack(fill="both", expand=True)
         
-        legend = ttk.Frame(self.sidebar)
-        legend.pack(fill="x", pady=10)
-        tk.Label(legend, text="■ Current", fg="blue").pack(anchor="w")
-        tk.Label(legend, text="■ Answered", fg="green").pack(anchor="w")
-        tk.Label(legend, text="■ Marked", fg="orange").pack(anchor="w")
+        self.legend = ttk.Frame(self.sidebar)
+        self.legend.pack(fill="x", pady=10)
+        tk.Label(self.legend, text="■ Current", fg="blue").pack(anchor="w")
+        tk.Label(self.legend, text="■ Answered", fg="green").pack(anchor="w")
+        tk.Label(self.legend, text="■ Marked", fg="orange").pack(anchor="w")
 
         # Content (Left)
         self.main_area = ttk.Frame(container, padding=10)
@@ -851,7 +981,7 @@ class ExamTakeFrame(ttk.Frame):
         self.opt_vars = [tk.IntVar(value=0) for _ in range(4)]
         self.check_buttons = []
         for i in range(4):
-            cb = ttk.Checkbutton(self.main_area, text="", variable=self.opt_vars[i])
+            cb = ttk.Checkbutton(self.main_area, text="", variable=self.opt_vars[i], command=lambda i=i: self._toggle(i))
             cb.pack(anchor="w", pady=3)
             self.check_buttons.append(cb)
 
@@ -861,44 +991,72 @@ class ExamTakeFrame(ttk.Frame):
         self.progress_label = ttk.Label(nav, text="")
         self.progress_label.pack(side="left")
 
-        ttk.Button(nav, text="Submit Exam", command=self.submit).pack(side="right", padx=6)
+        self.btn_submit = ttk.Button(nav, text="Submit Exam", command=self.submit)
+        self.btn_submit.pack(side="right", padx=6)
         ttk.Button(nav, text="Next >", command=self.next_q).pack(side="right", padx=6)
         ttk.Button(nav, text="< Prev", command=self.prev_q).pack(side="right", padx=6)
-        self.btn_mark = tk.Button(nav, text="Mark for Review", bg="lightyellow", command=self.toggle_mark)
+        self.btn_mark = tk.Button(nav, command=self.toggle_mark, **_MARK_BTN_CONFIG[False])
         self.btn_mark.pack(side="right", padx=20)
-        self.nav_buttons = []
+        self._mark_state = False
+        self._nav_pool: List[tk.Button] = []
+        self.nav_buttons: List[tk.Button] = []
+        self._nav_state: List[int] = []
+        self._nav_dirty: Set[int] = set()  # nav indices to recolor on the next render
+        self._shown_index = -1  # question currently shown in the main area
 
     def load_exam(self, exam: Exam):
         self.stop_timer()
         self.exam = exam
         self.index = 0
-        self.answers = [set() for _ in range(len(exam.questions))]
+        self.answers = [0] * len(exam.questions)
+        self._correct_masks = [to_mask(q.correct_indices) for q in exam.questions]
         self.marked_questions = set()
         self.started_at = time.time()
         self.end_time = self.started_at + exam.duration_seconds
         self._auto_submitted = False
+        self._shown_index = -1
         self.create_nav_grid()
         self.render()
         self._tick()
 
+    def on_show(self):
+        # Back on screen with an exam running: restart the per-second countdown right away
+        if self.exam and self._timer_job and not self._auto_submitted:
+            self.stop_timer()
+            self._tick()
+
     def create_nav_grid(self):
-        for w in self.grid_frame.winfo_children(): w.destroy()
-        self.nav_buttons = []
-        if not self.exam: return
+        # Buttons are pooled across exams: reuse what exists, create only the extra ones
+        n = len(self.exam.questions) if self.exam else 0
         cols = 5
-        for i in range(len(self.exam.questions)):
-            btn = tk.Button(self.grid_frame, text=str(i + 1), width=4, command=lambda idx=i: self.jump_to(idx))
-            btn.grid(row=i//cols, column=i%cols, padx=2, pady=2)
-            self.nav_buttons.append(btn)
+        # Unmap the grid while buttons are added/removed: one geometry pass and redraw when it is re-packed
+        self.grid_frame.pack_forget()
+        for i in range(len(self._nav_pool), n):
+            btn = tk.Button(self.grid_frame, text=str(i + 1), width=4, command=functools.partial(self.jump_to, i))
+            r, c = divmod(i, cols)
+            btn.grid(row=r, column=c, padx=2, pady=2)
+            self._nav_pool.append(btn)
+        for i, btn in enumerate(self._nav_pool):
+            if i < n:
+                if not btn.winfo_manager():
+                    r, c = divmod(i, cols)
+                    btn.grid(row=r, column=c, padx=2, pady=2)
+            else:
+                btn.grid_forget()
+        self.nav_buttons = self._nav_pool[:n]
+        self._nav_state = [-1] * n  # force a recolor on the next render
+        self._nav_dirty = set(range(n))
+        self.grid_frame.pack(fill="both", expand=True, before=self.legend)
 
     def jump_to(self, target):
-        self._save_current()
+        self._nav_dirty.update((self.index, target))
         self.index = target
         self.render()
 
     def toggle_mark(self):
         if self.index in self.marked_questions: self.marked_questions.remove(self.index)
         else: self.marked_questions.add(self.index)
+        self._nav_dirty.add(self.index)
         self.render()
 
     def stop_timer(self):
@@ -909,77 +1067,112 @@ class ExamTakeFrame(ttk.Frame):
     def _tick(self):
         if not self.exam: return
         left = int(self.end_time - time.time())
-        mm, ss = max(0, left) // 60, max(0, left) % 60
-        self.timer_label.config(text=f"Time left: {mm:02d}:{ss:02d}")
+        # Label updates are invisible while another frame is raised; the deadline check is not.
+        # (All frames share one grid cell, so winfo_ismapped() stays true behind other frames.)
+        shown = self.app.current_frame_name == "ExamTakeFrame"
+        if shown:
+            mm, ss = max(0, left) // 60, max(0, left) % 60
+            self._set_text(self.timer_label, f"Time left: {mm:02d}:{ss:02d}")
         if left <= 0 and not self._auto_submitted:
             self._auto_submitted = True
-            self._save_current()
             self._submit_internal(auto=True)
             return
-        self._timer_job = self.after(1000, self._tick)
+        # Hidden: nothing to redraw, so sleep until the deadline (on_show resumes the 1s ticks)
+        self._timer_job = self.after(1000 if shown else max(1, left) * 1000, self._tick)
 
-    def _current_selection(self) -> Set[int]:
-        return {i for i in range(4) if int(self.opt_vars[i].get()) == 1}
+    def _toggle(self, i: int):
+        # Checkbutton callback: keep the answer set in Python instead of polling the Tk vars
+        if self.exam: self.answers[self.index] ^= 1 << i
 
-    def _save_current(self):
-        if self.exam: self.answers[self.index] = self._current_selection()
+    def _set_text(self, widget, text: str):
+        # Skip configure (and the label's re-wrap) when the text is unchanged
+        if self._last_text.get(widget) != text:
+            widget.config(text=text)
+            self._last_text[widget] = text
 
     def render(self):
+        # Coalesce several render requests in the same event tick into one redraw
+        if self._render_pending: return
+        self._render_pending = True
+        self.after_idle(self._do_render)
+
+    def _do_render(self):
+        self._render_pending = False
         if not self.exam: return
+        # Question widgets only change with the index; marking a question touches just the
+        # mark button and its nav button
+        if self._shown_index != self.index:
+            self._render_question()
+        self._render_mark()
+        self._render_nav()
+
+    def _render_question(self):
+        self._shown_index = self.index
         q = self.exam.questions[self.index]
-        self.title_label.config(text=f"{self.exam.title}")
-        self.q_label.config(text=f"Q{self.index+1}: {q.text}")
-        
-        for i in range(4): self.check_buttons[i].config(text=q.options[i])
-        saved = self.answers[self.index]
-        for i in range(4): self.opt_vars[i].set(1 if i in saved else 0)
-            
-        self.progress_label.config(text=f"Question: {self.index+1}/{len(self.exam.questions)}")
-        
-        if self.index in self.marked_questions:
-            self.btn_mark.config(text="Unmark Flag", bg="orange", fg="white")
-        else:
-            self.btn_mark.config(text="Mark for Review", bg="lightyellow", fg="black")
+        self._set_text(self.title_label, f"{self.exam.title}")
+        self._set_text(self.q_label, f"Q{self.index+1}: {q.text}")
 
-        for i, btn in enumerate(self.nav_buttons):
-            bg, fg = "#f0f0f0", "black"
-            if len(self.answers[i]) > 0: bg = "#90ee90"
-            if i in self.marked_questions: bg = "orange"
-            if i == self.index: bg, fg = "blue", "white"
-            btn.config(bg=bg, fg=fg)
+        for i in range(4): self._set_text(self.check_buttons[i], q.options[i])
+        saved = self.answers[self.index]
+        for i in range(4): self.opt_vars[i].set(saved >> i & 1)
+
+        self._set_text(self.progress_label, f"Question: {self.index+1}/{len(self.exam.questions)}")
+
+    def _render_mark(self):
+        is_marked = self.index in self.marked_questions
+        if is_marked != self._mark_state:
+            self.btn_mark.config(**_MARK_BTN_CONFIG[is_marked])
+            self._mark_state = is_marked
+
+    def _render_nav(self):
+        # Only buttons whose current/marked/answered state may have changed are recomputed
+        marked = self.marked_questions
+        for i in self._nav_dirty:
+            state = ((i == self.index) << 2) | ((i in marked) << 1) | (self.answers[i] != 0)
+            if state != self._nav_state[i]:
+                bg, fg = _NAV_COLORS[state]
+                self.nav_buttons[i].config(bg=bg, fg=fg)
+                self._nav_state[i] = state
+        self._nav_dirty = set()
 
     def next_q(self):
-        self._save_current()
         if self.index < len(self.exam.questions) - 1:
+            self._nav_dirty.update((self.index, self.index + 1))
             self.index += 1
             self.render()
 
     def prev_q(self):
-        self._save_current()
         if self.index > 0:
+            self._nav_dirty.update((self.index, self.index - 1))
             self.index -= 1
             self.render()
 
     def submit(self):
-        self._save_current()
-        done = sum(1 for a in self.answers if len(a) > 0)
-        if not messagebox.askyesno("Submit", f"Answered: {done}/{len(self.exam.questions)}\nSubmit now?"): return
-        self._submit_internal(False)
+        done = sum(1 for a in self.answers if a)
+        if self._confirm and self._confirm.winfo_exists():
+            self._confirm.lift(); return
+        self._confirm = ConfirmDialog(
+            self, "Submit", f"Answered: {done}/{len(self.exam.questions)}\nSubmit now?",
+            on_yes=lambda: self._submit_internal(False)
+        )
 
     def _submit_internal(self, auto):
-        total_score = 0.0
-        for ans, q in zip(self.answers, self.exam.questions):
-            earned, _, _ = score_question_partial(ans, set(q.correct_indices), 1.0)
-            total_score += earned
-        
+        # Auto submit may fire while the confirm dialog is still open
+        if self._confirm and self._confirm.winfo_exists():
+            self._confirm.destroy()
+        self._confirm = None
+        selections = [[i for i in range(4) if m >> i & 1] for m in self.answers]
+        total_score = sum(score_mask_partial(m, c, 1.0) for m, c in zip(self.answers, self._correct_masks))
+
         u = self.app.current_user
+        store = self.app.store
         a = Attempt(
-            self.app.store.new_attempt_id(), self.exam.exam_id, self.exam.access_code, self.exam.title,
+            store.new_attempt_id(), self.exam.exam_id, self.exam.access_code, self.exam.title,
             u.username, u.full_name, u.student_id,
             total_score, len(self.exam.questions), self.started_at, time.time(),
-            int(time.time() - self.started_at), [sorted(list(s)) for s in self.answers]
+            int(time.time() - self.started_at), selections
         )
-        self.app.store.add_attempt(a)
+        store.add_attempt(a)
         self.stop_timer()
         msg = f"Time over. Auto submit.\nScore: {total_score:.2f}" if auto else f"Submitted!\nScore: {total_score:.2f}"
         messagebox.showinfo("Done", msg)
@@ -990,11 +1183,20 @@ class ExamTakeFrame(ttk.Frame):
         self.app.show_frame("StudentFrame")
 
 
+_REVIEW_BOX = ("  [ ]", "  [x]")  # indexed by "option selected"
+_REVIEW_RULE = "-" * 40 + "\n"
+
+
 class ReviewFrame(ttk.Frame):
+    REVIEW_CHUNK = 10  # questions rendered per batch
+    REVIEW_FULL = 40   # exams up to this size are rendered in one go (no scroll-driven appends)
+
     def __init__(self, parent, app):
         super().__init__(parent)
         self.app = app
         self.exam = None; self.attempt = None
+        self._rendered_upto = 0
+        self._prepared_exam_id: Optional[str] = None
         Header(self, "Review").pack(fill="x")
         
         top = ttk.Frame(self); top.pack(fill="x")
@@ -1002,29 +1204,62 @@ class ReviewFrame(ttk.Frame):
         self.info_label.pack(side="left")
         ttk.Button(top, text="Back", command=self.go_back).pack(side="right")
         
-        self.text = tk.Text(self, wrap="word", height=32); self.text.pack(fill="both", expand=True)
+        # Read-only output: no undo stack, fixed-width font keeps line measurement cheap
+        self.text = tk.Text(
+            self, wrap="word", height=32, font=("Consolas", 10),
+            undo=False, autoseparators=False, maxundo=0, yscrollcommand=self._on_yscroll
+        )
+        self.text.pack(fill="both", expand=True)
 
     def load_review(self, exam, attempt, back_to):
         self.exam = exam; self.attempt = attempt; self.back_to = back_to
+        self._prepare_exam()
         self.render()
 
+    def _prepare_exam(self):
+        # Option lines only depend on the exam; render() just prefixes the checkbox glyph.
+        # Reviewing several attempts of the same exam reuses them.
+        if self._prepared_exam_id == self.exam.exam_id: return
+        self._prepared_exam_id = self.exam.exam_id
+        self._correct_masks = [to_mask(q.correct_indices) for q in self.exam.questions]
+        self._opt_lines = [
+            [f" {oi+1}. {opt} {'(correct)' if cm >> oi & 1 else ''}\n" for oi, opt in enumerate(q.options)]
+            for q, cm in zip(self.exam.questions, self._correct_masks)
+        ]
+
+    def _render_question(self, i: int) -> str:
+        q = self.exam.questions[i]
+        sel = to_mask(self.attempt.answers[i]) if i < len(self.attempt.answers) else 0
+        earned = score_mask_partial(sel, self._correct_masks[i], 1.0)
+
+        opts = "".join(_REVIEW_BOX[sel >> oi & 1] + line for oi, line in enumerate(self._opt_lines[i]))
+        return f"Q{i+1}: {q.text} (Earned: {earned:.2f})\n{opts}{_REVIEW_RULE}"
+
+    def _append_chunk(self, head: str = "", clear: bool = False, count: int = 0):
+        # Append the next `count` (default REVIEW_CHUNK) questions, after an optional head, in one Text.insert
+        end = min(self._rendered_upto + (count or self.REVIEW_CHUNK), len(self.exam.questions))
+        block = head + "".join(self._render_question(i) for i in range(self._rendered_upto, end))
+        self._rendered_upto = end
+        self.text.config(state="normal")
+        if clear: self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, block)
+        self.text.config(state="disabled")
+
+    def _on_yscroll(self, first, last):
+        # Load more questions once the view gets close to the rendered end
+        if self.exam and self._rendered_upto < len(self.exam.questions) and float(last) > 0.9:
+            self.after_idle(self._load_more)
+
+    def _load_more(self):
+        if self.exam and self._rendered_upto < len(self.exam.questions):
+            self._append_chunk()
+
     def render(self):
-        self.text.config(state="normal"); self.text.delete("1.0", tk.END)
+        # Small exams render fully; larger ones only the first chunk, the rest is appended while scrolling
         total_q = len(self.exam.questions)
-        self.text.insert(tk.END, f"Score: {self.attempt.score:.2f}/{total_q}\n\n")
-        
-        for i, q in enumerate(self.exam.questions):
-            user_sel = set(self.attempt.answers[i]) if i < len(self.attempt.answers) else set()
-            correct = set(q.correct_indices)
-            earned, _, _ = score_question_partial(user_sel, correct, 1.0)
-            
-            self.text.insert(tk.END, f"Q{i+1}: {q.text} (Earned: {earned:.2f})\n")
-            for oi, opt in enumerate(q.options):
-                mu = "[x]" if oi in user_sel else "[ ]"
-                mc = "(correct)" if oi in correct else ""
-                self.text.insert(tk.END, f"  {mu} {oi+1}. {opt} {mc}\n")
-            self.text.insert(tk.END, "-"*40 + "\n")
-        self.text.config(state="disabled")
+        self._rendered_upto = 0
+        self._append_chunk(f"Score: {self.attempt.score:.2f}/{total_q}\n\n", clear=True,
+                           count=total_q if total_q <= self.REVIEW_FULL else self.REVIEW_CHUNK)
 
     def go_back(self):
         self.app.show_frame(self.back_to)
@@ -1034,6 +1269,7 @@ class TeacherAttemptFrame(ReviewFrame):
     def load_attempt(self, attempt, back_to):
         self.attempt = attempt; self.back_to = back_to
         self.exam = self.app.store.get_exam(attempt.exam_id)
+        self._prepare_exam()
         self.render()
 
 
@@ -1045,18 +1281,24 @@ class TemplatePreviewFrame(ttk.Frame):
         Header(self, "Template Preview").pack(fill="x")
         ttk.Button(self, text="Back", command=self.go_back).pack(anchor="e")
         self.text = tk.Text(self); self.text.pack(fill="both", expand=True)
+        # template_id -> formatted question blocks (cleared on reload / template save)
+        self._block_cache: Dict[str, List[str]] = {}
+
+    def drop_cached(self, tid: str):
+        self._block_cache.pop(tid, None)
+
+    def clear_cache(self):
+        self._block_cache.clear()
 
     def load_template(self, tid, back_to):
         self.template_id = tid; self.back_to = back_to
         t = self.app.store.get_template(tid)
         self.text.config(state="normal"); self.text.delete("1.0", tk.END)
         if t:
-            self.text.insert(tk.END, f"Template: {t.title}\nQuestions: {len(t.questions)}\n\n")
-            for i, q in enumerate(t.questions):
-                self.text.insert(tk.END, f"Q{i+1}: {q.text}\n")
-                for oi, opt in enumerate(q.options):
-                    mark = " (correct)" if oi in q.correct_indices else ""
-                    self.text.insert(tk.END, f"  {oi+1}. {opt}{mark}\n")
+            blocks = self._block_cache.get(tid)
+            if blocks is None:
+                blocks = self._block_cache[tid] = _question_blocks(t.questions)
+            self.text.insert(tk.END, f"Template: {t.title}\nQuestions: {len(t.questions)}\n\n" + "".join(blocks))
         self.text.config(state="disabled")
 
     def go_back(self): self.app.show_frame(self.back_to)
@@ -1070,18 +1312,21 @@ class ExamPreviewFrame(ttk.Frame):
         Header(self, "Exam Preview").pack(fill="x")
         ttk.Button(self, text="Back", command=self.go_back).pack(anchor="e")
         self.text = tk.Text(self); self.text.pack(fill="both", expand=True)
+        # exam_id -> formatted question blocks (exams are immutable once published)
+        self._block_cache: Dict[str, List[str]] = {}
+
+    def clear_cache(self):
+        self._block_cache.clear()
 
     def load_exam(self, eid, back_to):
         self.exam_id = eid; self.back_to = back_to
         e = self.app.store.get_exam(eid)
         self.text.config(state="normal"); self.text.delete("1.0", tk.END)
         if e:
-            self.text.insert(tk.END, f"Exam: {e.title}\nCode: {e.access_code}\n\n")
-            for i, q in enumerate(e.questions):
-                self.text.insert(tk.END, f"Q{i+1}: {q.text}\n")
-                for oi, opt in enumerate(q.options):
-                    mark = " (correct)" if oi in q.correct_indices else ""
-                    self.text.insert(tk.END, f"  {oi+1}. {opt}{mark}\n")
+            blocks = self._block_cache.get(eid)
+            if blocks is None:
+                blocks = self._block_cache[eid] = _question_blocks(e.questions)
+            self.text.insert(tk.END, f"Exam: {e.title}\nCode: {e.access_code}\n\n" + "".join(blocks))
         self.text.config(state="disabled")
 
     def go_back(self): self.app.show_frame(self.back_to)
\ No newline at end of file
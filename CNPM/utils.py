@@ -1,10 +1,12 @@
 # utils.py
+import functools
+import io
 import time
 from tkinter import messagebox
 from typing import List, Optional, Set, Tuple
 
 # Import từ models để dùng type hints và logic tính điểm
-from models import Template, Exam, Attempt, score_question_partial
+from models import Template, Exam, Attempt, to_mask, score_mask_partial
 
 try:
     from docx import Document
@@ -15,32 +17,72 @@ except ImportError:
 # -----------------------------
 # Time helpers
 # -----------------------------
+@functools.lru_cache(maxsize=1024)
+def _parse_dt_cached(s: str) -> int:
+    return int(time.mktime(time.strptime(s, "%Y-%m-%d %H:%M")))
+
 def parse_dt(s: str) -> Optional[int]:
     """Parse 'YYYY-MM-DD HH:MM' to unix timestamp (local)."""
-    s = (s or "").strip()
     try:
-        return int(time.mktime(time.strptime(s, "%Y-%m-%d %H:%M")))
+        return _parse_dt_cached((s or "").strip())
     except Exception:
         return None
 
+@functools.lru_cache(maxsize=8192)
+def _fmt_dt_cached(ts: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
 def fmt_dt(ts: int) -> str:
     try:
-        return time.strftime("%Y-%m-%d %H:%M", time.localtime(int(ts)))
+        return _fmt_dt_cached(int(ts))
     except Exception:
         return "N/A"
 
+@functools.lru_cache(maxsize=8192)
+def _fmt_dt_full_cached(ts: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
 def fmt_dt_full(ts: float) -> str:
+    # Only whole seconds are shown, so key the cache by int seconds
     try:
-        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(ts)))
+        return _fmt_dt_full_cached(int(float(ts)))
     except Exception:
         return "N/A"
 
 # -----------------------------
 # Export helpers
 # -----------------------------
+# File docx rỗng (bytes), tạo ở lần export đầu để chỉ đọc template mặc định của python-docx một lần
+_DOCX_TEMPLATE: Optional[bytes] = None
+
+
+def _new_document():
+    """Tạo Document rỗng từ template đã cache."""
+    global _DOCX_TEMPLATE
+    if _DOCX_TEMPLATE is None:
+        buf = io.BytesIO()
+        Document().save(buf)
+        _DOCX_TEMPLATE = buf.getvalue()
+    return Document(io.BytesIO(_DOCX_TEMPLATE))
+
+
+def _add_lines(doc, lines: List[str]):
+    """Một paragraph, các dòng cách nhau bằng soft break (một <w:p> thay vì mỗi dòng một cái)."""
+    run = doc.add_paragraph().add_run()
+    for n, line in enumerate(lines):
+        if n:
+            run.add_break()
+        run.add_text(line)
+
+
+def _mask_str(mask: int) -> str:
+    """Số thứ tự (từ 1) các lựa chọn trong mask, ví dụ 0b101 -> '1, 3' (hoặc 'none')."""
+    return ", ".join(str(i + 1) for i in range(mask.bit_length()) if mask >> i & 1) or "none"
+
+
 def export_template_to_word(t: Template, filepath: str, include_answers: bool = True):
     try:
-        doc = Document()
+        doc = _new_document()
         doc.add_heading(f"Template: {t.title}", level=1)
         doc.add_paragraph(f"Template ID: {t.template_id}")
         doc.add_paragraph(f"Created by: {t.created_by}")
@@ -48,8 +90,7 @@ def export_template_to_word(t: Template, filepath: str, include_answers: bool =
 
         for i, q in enumerate(t.questions, start=1):
             doc.add_heading(f"Q{i}: {q.text}", level=2)
-            for oi, opt in enumerate(q.options, start=1):
-                doc.add_paragraph(f"{oi}. {opt}", style="List Bullet")
+            _add_lines(doc, [f"{oi}. {opt}" for oi, opt in enumerate(q.options, start=1)])
             if include_answers:
                 correct = ", ".join(str(x + 1) for x in sorted(q.correct_indices))
                 doc.add_paragraph(f"Correct: {correct}")
@@ -59,7 +100,7 @@ def export_template_to_word(t: Template, filepath: str, include_answers: bool =
 
 def export_exam_to_word(e: Exam, filepath: str, include_answers: bool = True):
     try:
-        doc = Document()
+        doc = _new_document()
         doc.add_heading(f"Exam: {e.title}", level=1)
         doc.add_paragraph(f"Exam ID: {e.exam_id}")
         doc.add_paragraph(f"Code: {e.access_code}")
@@ -72,8 +113,7 @@ def export_exam_to_word(e: Exam, filepath: str, include_answers: bool = True):
 
         for i, q in enumerate(e.questions, start=1):
             doc.add_heading(f"Q{i}: {q.text}", level=2)
-            for oi, opt in enumerate(q.options, start=1):
-                doc.add_paragraph(f"{oi}. {opt}", style="List Bullet")
+            _add_lines(doc, [f"{oi}. {opt}" for oi, opt in enumerate(q.options, start=1)])
             if include_answers:
                 correct = ", ".join(str(x + 1) for x in sorted(q.correct_indices))
                 doc.add_paragraph(f"Correct: {correct}")
@@ -83,9 +123,19 @@ def export_exam_to_word(e: Exam, filepath: str, include_answers: bool = True):
 
 def export_exam_results_to_excel(e: Exam, attempts: List[Attempt], filepath: str):
     try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Results"
+        rows = [
+            [
+                e.title, e.exam_id, e.access_code,
+                a.username, a.full_name, a.student_id,
+                round((a.score / max(1, a.total)) * 10.0, 2), round(a.score, 4), a.total,
+                a.time_taken_seconds, fmt_dt_full(a.submitted_at)
+            ]
+            for a in attempts
+        ]
+
+        # write-only: ghi thẳng từng dòng ra file, không giữ Cell trong bộ nhớ
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Results")
 
         ws.append([
             "Exam Title", "Exam ID", "Code",
@@ -94,21 +144,15 @@ def export_exam_results_to_excel(e: Exam, attempts: List[Attempt], filepath: str
             "Time Taken (sec)", "Submitted At"
         ])
 
-        for a in attempts:
-            score10 = (a.score / max(1, a.total)) * 10.0
-            ws.append([
-                e.title, e.exam_id, e.access_code,
-                a.username, a.full_name, a.student_id,
-                round(score10, 2), round(a.score, 4), a.total,
-                a.time_taken_seconds, fmt_dt_full(a.submitted_at)
-            ])
+        for row in rows:
+            ws.append(row)
         wb.save(filepath)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to export xlsx: {e}")
 
 def export_attempt_to_word(e: Exam, a: Attempt, filepath: str):
     try:
-        doc = Document()
+        doc = _new_document()
         doc.add_heading("Attempt Report", level=1)
         doc.add_paragraph(f"Exam: {e.title}")
         doc.add_paragraph(f"Exam ID: {e.exam_id} | Code: {e.access_code}")
@@ -124,19 +168,23 @@ def export_attempt_to_word(e: Exam, a: Attempt, filepath: str):
         answers = a.answers or []
         points_per_q = 10.0 / total_q
 
+        points_str = f"{points_per_q:.2f}"
+
         for i, q in enumerate(e.questions):
-            user_sel = set(answers[i]) if i < len(answers) else set()
-            correct = set(q.correct_indices)
-            earned, missing, extra = score_question_partial(user_sel, correct, points=points_per_q)
+            # bitmask: bit i = lựa chọn i, tránh tạo set và set diff cho mỗi câu
+            sel = to_mask(answers[i]) if i < len(answers) else 0
+            cm = to_mask(q.correct_indices)
+            earned = score_mask_partial(sel, cm, points_per_q)
+            missing, extra = (cm & ~sel, sel & ~cm) if cm else (0, 0)
 
             doc.add_heading(f"Q{i+1}: {q.text}", level=2)
-            doc.add_paragraph(f"Earned: {earned:.2f}/{points_per_q:.2f}")
-            for oi, opt in enumerate(q.options, start=1):
-                mu = "[x]" if (oi - 1) in user_sel else "[ ]"
-                mc = "(correct)" if (oi - 1) in correct else ""
-                doc.add_paragraph(f"{mu} {oi}. {opt} {mc}")
-            doc.add_paragraph("Missing correct: " + (", ".join(str(x+1) for x in sorted(missing)) if missing else "none"))
-            doc.add_paragraph("Extra wrong: " + (", ".join(str(x+1) for x in sorted(extra)) if extra else "none"))
+            doc.add_paragraph(f"Earned: {earned:.2f}/{points_str}")
+            _add_lines(doc, [
+                f"{'[x]' if sel >> (oi - 1) & 1 else '[ ]'} {oi}. {opt} {'(correct)' if cm >> (oi - 1) & 1 else ''}"
+                for oi, opt in enumerate(q.options, start=1)
+            ])
+            doc.add_paragraph("Missing correct: " + _mask_str(missing))
+            doc.add_paragraph("Extra wrong: " + _mask_str(extra))
 
         doc.save(filepath)
     except Exception as e:
@@ -3,62 +3,131 @@
 # Features:
 # - Login with role (Admin/Teacher/Student)
 # - Admin: create user, list users, reset password
-# - Teacher: build templates, publish exams (code + time window), view attempts, export Word/Excel, delete
+# - Teacher: build templates, publish exams (code + time window), view attempts, export Word/CSV/Excel, delete
 # - Student: join exam by code, take exam, store attempt, review if teacher allows
 #
 # Dependencies for export (optional):
 #   pip install python-docx openpyxl
+#   pip install xlsxwriter   (streams large Excel results with constant memory; used instead of openpyxl if present)
+# Optional speedup for loading/saving data:
+#   pip install orjson
+# Optional speedup for grading large classes in the Excel export:
+#   pip install numpy
 #
-# Data file: quiz_data.json (auto created with default users)
+# Data files (auto created with default users): quiz_users.json, quiz_templates.json, quiz_exams.json
+# Attempts: quiz_attempts.jsonl next to them (append-only, one attempt per line)
+# An old single quiz_data.json is split into these on first run and kept as quiz_data.json.bak
 
 from __future__ import annotations
 
+import datetime
+import csv
+import functools
+import hashlib
+import hmac
+import importlib
+import io
+import itertools
 import json
 import os
 import time
 import secrets
+import select
 import string
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional, Set, Any, Tuple
-
-DATA_FILE = "quiz_data.json"
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Set, FrozenSet, Any, Tuple, Iterable, Iterator
+
+DATA_FILE = "quiz_data.json"            # legacy single-file store, split on first load
+ATTEMPTS_FILE = "quiz_attempts.jsonl"
+# one small file per collection, so e.g. a password change rewrites only the users
+SECTION_FILES = {
+    "users": "quiz_users.json",
+    "templates": "quiz_templates.json",
+    "exams": "quiz_exams.json",
+}
 ROLES = ["Admin", "Teacher", "Student"]
 ROLE_CANON = {"admin": "Admin", "teacher": "Teacher", "student": "Student"}
 
-# Optional export libs
-try:
-    from docx import Document  # type: ignore
-except Exception:
-    Document = None  # type: ignore
+# Optional export libs (python-docx, openpyxl, xlsxwriter, numpy) are heavy to import and only
+# needed when a teacher exports, so they are loaded on first use via _lazy() instead of at startup.
+_LAZY: Dict[Tuple[str, str], Any] = {}
+
+
+def _lazy(module: str, attr: str = "") -> Any:
+    """module (or module.attr) imported on first call and cached; None if not installed."""
+    key = (module, attr)
+    if key not in _LAZY:
+        try:
+            mod = importlib.import_module(module)
+            _LAZY[key] = getattr(mod, attr) if attr else mod
+        except Exception:
+            _LAZY[key] = None
+    return _LAZY[key]
 
+# Optional fast JSON (falls back to the stdlib json module)
 try:
-    from openpyxl import Workbook  # type: ignore
+    import orjson  # type: ignore
 except Exception:
-    Workbook = None  # type: ignore
+    orjson = None  # type: ignore
+
+
+def _json_dumps(obj: Any, pretty: bool = False) -> bytes:
+    """Serialize to UTF-8 bytes (non-ASCII kept as-is)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(buf: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
 
 
 # -----------------------------
 # Date/Time helpers
 # -----------------------------
+# strptime/strftime are slow-ish (strptime goes through the pure-Python _strptime module),
+# and listings/exports format the same few timestamps over and over, so memoize them.
+@functools.lru_cache(maxsize=4096)
+def _parse_dt_cached(s: str) -> int:
+    return int(time.mktime(time.strptime(s, "%Y-%m-%d %H:%M")))
+
+
+@functools.lru_cache(maxsize=8192)
+def _fmt_dt_cached(ts: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+
+@functools.lru_cache(maxsize=8192)
+def _fmt_dt_full_cached(ts: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
 def parse_dt(s: str) -> Optional[int]:
     """Parse 'YYYY-MM-DD HH:MM' to unix timestamp (local). Returns None if invalid."""
-    s = (s or "").strip()
     try:
-        return int(time.mktime(time.strptime(s, "%Y-%m-%d %H:%M")))
+        return _parse_dt_cached((s or "").strip())
     except Exception:
         return None
 
 
 def fmt_dt(ts: int) -> str:
     try:
-        return time.strftime("%Y-%m-%d %H:%M", time.localtime(int(ts)))
+        return _fmt_dt_cached(int(ts))
     except Exception:
         return "N/A"
 
 
 def fmt_dt_full(ts: float) -> str:
+    # only whole seconds are shown, so key the cache by int seconds
     try:
-        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(ts)))
+        return _fmt_dt_full_cached(int(float(ts)))
     except Exception:
         return "N/A"
 
@@ -66,28 +135,15 @@ def fmt_dt_full(ts: float) -> str:
 def is_valid_date_yyyy_mm_dd(s: str) -> bool:
     """Strict check: YYYY-MM-DD with month 1-12, day valid for month/leap year."""
     s = (s or "").strip()
+    # fromisoformat (3.11+) also takes forms like 20240131 / 2024-W05-3, so pin the shape first
+    if len(s) != 10 or s[4] != "-" or s[7] != "-":
+        return False
     try:
-        y, m, d = s.split("-")
-        y = int(y)
-        m = int(m)
-        d = int(d)
-        if y < 1900 or y > 2100:
-            return False
-        if m < 1 or m > 12:
-            return False
-        # days in month
-        dim = [31, 29 if _is_leap(y) else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][m - 1]
-        if d < 1 or d > dim:
-            return False
-        return True
-    except Exception:
+        return 1900 <= datetime.date.fromisoformat(s).year <= 2100
+    except ValueError:
         return False
 
 
-def _is_leap(y: int) -> bool:
-    return (y % 4 == 0 and y % 100 != 0) or (y % 400 == 0)
-
-
 def pause():
     input("\nPress ENTER to continue...")
 
@@ -95,6 +151,14 @@ def pause():
 # -----------------------------
 # Data Models
 # -----------------------------
+def to_mask(indices) -> int:
+    """Option indices -> bitmask (bit i = option i selected)."""
+    m = 0
+    for i in indices:
+        m |= 1 << i
+    return m
+
+
 @dataclass
 class User:
     username: str
@@ -108,8 +172,17 @@ class User:
 @dataclass
 class Question:
     text: str
-    options: List[str]              # 4 options
-    correct_indices: List[int]      # can be multiple
+    options: Tuple[str, ...]        # 4 options
+    correct_indices: Tuple[int, ...]  # can be multiple
+
+    def __post_init__(self):
+        # tuples: questions are never edited in place, so templates and exams share the same objects
+        self.options = tuple(self.options)
+        self.correct_indices = tuple(self.correct_indices)
+        # derived views for scoring/printing; plain attributes, not saved to JSON
+        self.correct_set: FrozenSet[int] = frozenset(self.correct_indices)
+        self.correct_sorted: Tuple[int, ...] = tuple(sorted(self.correct_set))
+        self.correct_mask: int = to_mask(self.correct_set)
 
 
 @dataclass
@@ -117,7 +190,7 @@ class Template:
     template_id: str
     title: str
     created_by: str
-    questions: List[Question]
+    questions: Tuple[Question, ...]
 
 
 @dataclass
@@ -133,7 +206,8 @@ class Exam:
     attempt_limit: int             # 0 means unlimited
     start_ts: int
     end_ts: int
-    questions: List[Question]
+    questions: Tuple[Question, ...]
+    password_hash: str = ""        # hex blake2b of the exam password; password stays "" once hashed
 
 
 @dataclass
@@ -153,6 +227,71 @@ class Attempt:
     answers: List[List[int]]
 
 
+def hash_exam_password(pw: str) -> str:
+    """Hex blake2b digest stored instead of the plaintext exam password."""
+    return hashlib.blake2b(pw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _remove_same(lst: List[Any], obj: Any):
+    """Remove obj itself (identity, not equality) from lst in place."""
+    for i, x in enumerate(lst):
+        if x is obj:
+            del lst[i]
+            return
+
+
+def _drop_ids(lst: List[Any], gone: Set[int]):
+    """Drop every item whose id() is in gone, compacting lst in place."""
+    j = 0
+    for x in lst:
+        if id(x) not in gone:
+            lst[j] = x
+            j += 1
+    del lst[j:]
+
+
+# Record -> dict by hand: the shapes are fixed, and asdict() recurses and deep-copies every field.
+def _user_to_dict(u: User) -> Dict[str, Any]:
+    return {
+        "username": u.username,
+        "password": u.password,
+        "role": u.role,
+        "full_name": u.full_name,
+        "dob": u.dob,
+        "student_id": u.student_id,
+    }
+
+
+def _question_to_dict(q: Question) -> Dict[str, Any]:
+    return {"text": q.text, "options": list(q.options), "correct_indices": list(q.correct_indices)}
+
+
+def _attempt_to_dict(a: Attempt) -> Dict[str, Any]:
+    return {
+        "attempt_id": a.attempt_id,
+        "exam_id": a.exam_id,
+        "code": a.code,
+        "title": a.title,
+        "username": a.username,
+        "full_name": a.full_name,
+        "student_id": a.student_id,
+        "score": a.score,
+        "total": a.total,
+        "started_at": a.started_at,
+        "submitted_at": a.submitted_at,
+        "time_taken_seconds": a.time_taken_seconds,
+        "answers": [list(x) for x in a.answers],
+    }
+
+
+def _user_from_dict(d: Dict[str, Any]) -> User:
+    return User(**d)
+
+
+def _attempt_from_dict(d: Dict[str, Any]) -> Attempt:
+    return Attempt(**d)
+
+
 # -----------------------------
 # Scoring (partial credit)
 # -----------------------------
@@ -167,45 +306,152 @@ def score_question_partial(user_sel: Set[int], correct: Set[int], points: float)
     """
     if not correct:
         return (0.0, set(), set())
-    c = len(user_sel & correct)
-    w = len(user_sel - correct)
-    k = len(correct)
-    earned_ratio = (c - w) / k
-    earned_ratio = max(0.0, min(1.0, earned_ratio))
-    earned = earned_ratio * points
+    earned = score_mask_partial(to_mask(user_sel), to_mask(correct), points)
     missing = correct - user_sel
     extra = user_sel - correct
     return earned, missing, extra
 
 
+def score_mask_partial(sel_mask: int, correct_mask: int, points: float) -> float:
+    """Same rule as score_question_partial, on option bitmasks (see to_mask)."""
+    k = correct_mask.bit_count()
+    if not k:
+        return 0.0
+    c = (sel_mask & correct_mask).bit_count()
+    w = (sel_mask & ~correct_mask).bit_count()
+    return max(0.0, min(1.0, (c - w) / k)) * points
+
+
+def score_question_earned(sel, q: Question, points: float = 1.0) -> float:
+    """Earned points only (no missing/extra sets); sel is an option mask or a set of indices."""
+    return score_mask_partial(sel if isinstance(sel, int) else to_mask(sel), q.correct_mask, points)
+
+
+def mask_diff(sel_mask: int, correct_mask: int) -> Tuple[int, int]:
+    """(missing, extra) as masks; both empty for a question without correct options, like score_question_partial."""
+    if not correct_mask:
+        return 0, 0
+    return correct_mask & ~sel_mask, sel_mask & ~correct_mask
+
+
+def mask_str(mask: int) -> str:
+    """1-based option numbers in a mask, e.g. 0b101 -> '1, 3' (or 'none')."""
+    return ", ".join(str(i + 1) for i in range(mask.bit_length()) if mask >> i & 1) or "none"
+
+
+def grade_attempts(e: Exam, attempts: List[Attempt]) -> List[float]:
+    """Raw score (each question max 1) per attempt, regraded from the stored answers in one pass."""
+    nq = len(e.questions)
+    if not attempts or not nq:
+        return [0.0] * len(attempts)
+    rows = []
+    for a in attempts:
+        ans = a.answers or []
+        rows.append([to_mask(ans[i]) if i < len(ans) else 0 for i in range(nq)])
+    correct_masks = [q.correct_mask for q in e.questions]
+    # optional: vectorized bulk grading (falls back to a plain loop)
+    np = _lazy("numpy")
+    if np is None:
+        return [sum(score_mask_partial(m, cm, 1.0) for m, cm in zip(r, correct_masks)) for r in rows]
+
+    sel = np.array(rows, dtype=np.uint8)              # (N, nq)
+    correct = np.array(correct_masks, dtype=np.uint8)  # (nq,)
+
+    def popcount(x):
+        return np.unpackbits(x[..., None], axis=-1).sum(axis=-1)
+
+    c = popcount(sel & correct).astype(np.float64)
+    w = popcount(sel & ~correct)
+    k = popcount(correct)
+    ratio = np.where(k > 0, (c - w) / np.maximum(k, 1), 0.0)
+    return np.clip(ratio, 0.0, 1.0).sum(axis=1).tolist()
+
+
 # -----------------------------
 # Storage + migrations
 # -----------------------------
 class DataStore:
-    def __init__(self, path: str):
+    def __init__(self, path: str, pretty: bool = False):
         self.path = path
+        # indent the data files (handy for reading/diffing them); compact by default
+        self.pretty = pretty
+        # Attempts grow fastest, so they live in an append-only JSONL sidecar
+        self.attempts_path = os.path.join(os.path.dirname(path), ATTEMPTS_FILE)
+        self.section_paths = {k: os.path.join(os.path.dirname(path), name) for k, name in SECTION_FILES.items()}
+        self._attempts_fp = None
+        self._batch_depth = 0
+        self._dirty: Set[str] = set()
+        # in-memory indexes over the raw dicts in self.data (rebuilt by _reindex)
+        self._users_by_name: Dict[str, Dict[str, Any]] = {}
+        self._templates_by_id: Dict[str, Dict[str, Any]] = {}
+        self._exams_by_id: Dict[str, Dict[str, Any]] = {}
+        self._exams_by_code: Dict[str, Dict[str, Any]] = {}
+        self._exams_per_template: Dict[str, int] = {}
+        self._exams_by_teacher: Dict[str, List[Dict[str, Any]]] = {}
+        self._attempts_by_exam: Dict[str, List[Dict[str, Any]]] = {}
+        self._attempts_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        self._attempt_counts: Dict[Tuple[str, str], int] = {}  # (username, exam_id) -> attempts
+        # attempts are only read from the sidecar the first time something asks for them
+        self._attempts_loaded = False
+        self._reserved_codes: Set[str] = set()
+        # IDs = store start time (ms) + per-process counter: unique even within one millisecond
+        self._id_base = int(time.time() * 1000)
+        self._id_counter = itertools.count()
+        # id(raw dict) -> (raw dict, dataclass built from it); dropped when the dict is mutated
+        self._objs: Dict[int, Tuple[Dict[str, Any], Any]] = {}
+        # (text, options, correct_indices) -> Question, see _question()
+        self._questions: Dict[Tuple[str, Tuple[str, ...], Tuple[int, ...]], Question] = {}
         self.data: Dict[str, Any] = {"users": [], "templates": [], "exams": [], "attempts": []}
         self.load()
 
-    def load(self):
-        if not os.path.exists(self.path):
-            self._seed_default()
-            self.save()
-            return
-
+    @staticmethod
+    def _read_json(path: str) -> Any:
+        """Parsed file content, or None if missing/corrupt."""
         try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                raw = json.load(f)
+            # slurp the whole file in one read and parse the bytes directly
+            with open(path, "rb", buffering=1 << 20) as f:
+                return _json_loads(f.read())
         except Exception:
+            return None
+
+    def load(self):
+        legacy_file = False
+        if any(os.path.exists(p) for p in self.section_paths.values()):
+            raw = {}
+            for k, p in self.section_paths.items():
+                v = self._read_json(p)
+                if isinstance(v, list):
+                    raw[k] = v
+            if "users" not in raw:
+                self._seed_default()
+                raw["users"] = self.data["users"]
+        elif os.path.exists(self.path):
+            raw = self._read_json(self.path)
+            legacy_file = True
+        else:
+            raw = None
+
+        if raw is None:
             self._seed_default()
             self.save()
+            self._reindex()
             return
 
         self.data = raw if isinstance(raw, dict) else {}
         self.data.setdefault("users", [])
         self.data.setdefault("templates", [])
         self.data.setdefault("exams", [])
-        self.data.setdefault("attempts", [])
+
+        # migrate attempts stored inside the data file (old format) to the sidecar.
+        # The sidecar only appears (via os.replace) once complete, so if it already exists an
+        # earlier run got this far and stopped before renaming the old file: don't copy them twice.
+        legacy = self.data.pop("attempts", None) or []
+        if legacy and not os.path.exists(self.attempts_path):
+            tmp = self.attempts_path + ".tmp"
+            with open(tmp, "wb") as f:
+                for a in legacy:
+                    f.write(_json_dumps(a) + b"\n")
+            os.replace(tmp, self.attempts_path)
 
         # Normalize users
         for u in self.data["users"]:
@@ -230,6 +476,11 @@ class DataStore:
             e.setdefault("attempt_limit", 0)
             e.setdefault("allow_review", False)
             e.setdefault("password", "")
+            e.setdefault("password_hash", "")
+            # hash legacy plaintext exam passwords (written out on the next exams save)
+            if e["password"] and not e["password_hash"]:
+                e["password_hash"] = hash_exam_password(e["password"])
+                e["password"] = ""
             e.setdefault("duration_seconds", 0)
             e.setdefault("start_ts", 0)
             e.setdefault("end_ts", 0)
@@ -239,32 +490,151 @@ class DataStore:
                     qu["correct_indices"] = [int(qu.get("correct_index", 0))]
                 qu.pop("correct_index", None)
 
-        for a in self.data["attempts"]:
-            try:
-                a["score"] = float(a.get("score", 0))
-            except Exception:
-                a["score"] = 0.0
-            a.setdefault("answers", [])
-
+        self._reindex()
         self.save()
+        if legacy_file:
+            # everything now lives in the per-collection files; keep the old one as a backup
+            os.replace(self.path, self.path + ".bak")
+
+    def _reindex(self):
+        """Build the lookup dicts. The first record wins on duplicate keys, like the old scans."""
+        self._objs = {}
+        self._users_by_name = {}
+        for u in self.data["users"]:
+            self._users_by_name.setdefault(u.get("username"), u)
+        self._templates_by_id = {}
+        for t in self.data["templates"]:
+            self._templates_by_id.setdefault(t.get("template_id"), t)
+        self._exams_by_id = {}
+        self._exams_by_code = {}
+        self._exams_per_template = {}
+        self._exams_by_teacher = {}
+        for e in self.data["exams"]:
+            self._index_exam(e)
+        # attempt indexes are built by _ensure_attempts()
+
+    def _obj(self, d: Dict[str, Any], build) -> Any:
+        hit = self._objs.get(id(d))
+        if hit is not None and hit[0] is d:
+            return hit[1]
+        o = build(d)
+        self._objs[id(d)] = (d, o)
+        return o
+
+    def _index_exam(self, e: Dict[str, Any]):
+        self._exams_by_id.setdefault(e.get("exam_id"), e)
+        code = (e.get("access_code") or "").upper()
+        if code:
+            self._exams_by_code.setdefault(code, e)
+            self._reserved_codes.discard(code)
+        tid = e.get("template_id")
+        self._exams_per_template[tid] = self._exams_per_template.get(tid, 0) + 1
+        self._exams_by_teacher.setdefault(e.get("created_by", ""), []).append(e)
+
+    def _index_attempt(self, a: Dict[str, Any]):
+        self._attempts_by_exam.setdefault(a.get("exam_id"), []).append(a)
+        self._attempts_by_user.setdefault(a.get("username"), []).append(a)
+        key = (a.get("username"), a.get("exam_id"))
+        self._attempt_counts[key] = self._attempt_counts.get(key, 0) + 1
+
+    def _ensure_attempts(self):
+        """Read + index the attempts sidecar on first use (login/admin flows never need it)."""
+        if self._attempts_loaded:
+            return
+        self._load_attempts()
+        self._attempts_by_exam = {}
+        self._attempts_by_user = {}
+        self._attempt_counts = {}
+        for a in self.data["attempts"]:
+            self._index_attempt(a)
+        self._attempts_loaded = True
+
+    def _load_attempts(self):
+        attempts: List[Dict[str, Any]] = []
+        if os.path.exists(self.attempts_path):
+            with open(self.attempts_path, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        a = _json_loads(line)
+                    except Exception:
+                        continue  # skip a torn/corrupt line
+                    try:
+                        a["score"] = float(a.get("score", 0))
+                    except Exception:
+                        a["score"] = 0.0
+                    a.setdefault("answers", [])
+                    attempts.append(a)
+        self.data["attempts"] = attempts
+
+    def _attempts_handle(self):
+        if self._attempts_fp is None:
+            self._attempts_fp = open(self.attempts_path, "ab")
+        return self._attempts_fp
+
+    def _close_attempts(self):
+        if self._attempts_fp is not None:
+            self._attempts_fp.close()
+            self._attempts_fp = None
+
+    def _rewrite_attempts(self):
+        """Rewrite the sidecar from memory (used by deletes/reset only)."""
+        self._close_attempts()
+        tmp = self.attempts_path + ".tmp"
+        with open(tmp, "wb") as f:
+            for a in self.data["attempts"]:
+                f.write(_json_dumps(a) + b"\n")
+        os.replace(tmp, self.attempts_path)
+
+    def save(self, sections=tuple(SECTION_FILES)):
+        """Write the given collections (default: all). Attempts are appended to the sidecar separately."""
+        for k in sections:
+            # encode first, then one write (json.dump issues a write per chunk)
+            buf = _json_dumps(self.data[k], pretty=self.pretty)
+            with open(self.section_paths[k], "wb", buffering=1 << 20) as f:
+                f.write(buf)
+
+    def _changed(self, section: str):
+        """Persist one collection after a mutation, or defer it while inside batch()."""
+        if self._batch_depth:
+            self._dirty.add(section)
+        else:
+            self.save((section,))
 
-    def save(self):
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+    @contextmanager
+    def batch(self):
+        """Group several mutations into a single save():  with store.batch(): ..."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                self.save(tuple(dirty))
 
     def reset_to_default(self):
         """Reset all data to default demo users (admin/teacher/student)."""
         self._seed_default()
+        self._reindex()
+        self._attempts_by_exam = {}
+        self._attempts_by_user = {}
+        self._attempt_counts = {}
+        self._attempts_loaded = True
         self.save()
+        self._rewrite_attempts()
 
     def _seed_default(self):
         self.data = {
             "users": [
-                asdict(User(username="admin", password="admin", role="Admin")),
-                asdict(User(username="teacher", password="teacher", role="Teacher",
-                           full_name="Teacher One", dob="1990-01-01")),
-                asdict(User(username="student", password="student", role="Student",
-                           full_name="Student One", dob="2005-01-01", student_id="SV001")),
+                {"username": "admin", "password": "admin", "role": "Admin",
+                 "full_name": "", "dob": "", "student_id": ""},
+                {"username": "teacher", "password": "teacher", "role": "Teacher",
+                 "full_name": "Teacher One", "dob": "1990-01-01", "student_id": ""},
+                {"username": "student", "password": "student", "role": "Student",
+                 "full_name": "Student One", "dob": "2005-01-01", "student_id": "SV001"},
             ],
             "templates": [],
             "exams": [],
@@ -273,104 +643,106 @@ class DataStore:
 
     # ---- Users ----
     def find_user(self, username: str) -> Optional[User]:
-        for u in self.data["users"]:
-            if u.get("username") == username:
-                return User(**u)
-        return None
+        u = self._users_by_name.get(username)
+        return self._obj(u, _user_from_dict) if u is not None else None
 
     def list_users(self) -> List[User]:
-        return [User(**u) for u in self.data["users"]]
+        return [self._obj(u, _user_from_dict) for u in self.data["users"]]
 
     def add_user(self, user: User) -> bool:
-        if self.find_user(user.username):
+        if user.username in self._users_by_name:
             return False
         user.role = ROLE_CANON.get(user.role.lower(), user.role)
         if user.role not in ROLES:
             user.role = "Student"
-        self.data["users"].append(asdict(user))
-        self.save()
+        d = _user_to_dict(user)
+        self.data["users"].append(d)
+        self._users_by_name[user.username] = d
+        self._changed("users")
         return True
 
     def update_password(self, username: str, new_password: str) -> bool:
-        for u in self.data["users"]:
-            if u.get("username") == username:
-                u["password"] = new_password
-                self.save()
-                return True
-        return False
+        u = self._users_by_name.get(username)
+        if u is None:
+            return False
+        u["password"] = new_password
+        self._objs.pop(id(u), None)
+        self._changed("users")
+        return True
 
     def update_profile(self, username: str, full_name: str, dob: str, student_id: str) -> bool:
-        for u in self.data["users"]:
-            if u.get("username") == username:
-                u["full_name"] = full_name
-                u["dob"] = dob
-                u["student_id"] = student_id
-                self.save()
-                return True
-        return False
+        u = self._users_by_name.get(username)
+        if u is None:
+            return False
+        u["full_name"] = full_name
+        u["dob"] = dob
+        u["student_id"] = student_id
+        self._objs.pop(id(u), None)
+        self._changed("users")
+        return True
 
     # ---- IDs/Codes ----
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}{self._id_base}{next(self._id_counter):06d}"
+
     def new_template_id(self) -> str:
-        return f"TP{int(time.time() * 1000)}"
+        return self._new_id("TP")
 
     def new_exam_id(self) -> str:
-        return f"EX{int(time.time() * 1000)}"
+        return self._new_id("EX")
 
     def new_attempt_id(self) -> str:
-        return f"AT{int(time.time() * 1000)}{secrets.randbelow(1000)}"
-
-    def _all_codes(self) -> Set[str]:
-        return {(e.get("access_code") or "").upper() for e in self.data["exams"] if e.get("access_code")}
+        return self._new_id("AT")
 
     def new_unique_code(self, length: int = 8) -> str:
         alphabet = string.ascii_uppercase + string.digits
-        existing = self._all_codes()
         while True:
             code = "".join(secrets.choice(alphabet) for _ in range(length))
-            if code not in existing:
+            if code not in self._exams_by_code and code not in self._reserved_codes:
+                # reserved until the exam is saved, so back-to-back calls never hand out the same code
+                self._reserved_codes.add(code)
                 return code
 
     # ---- Templates ----
     def add_template(self, t: Template):
-        self.data["templates"].append(self._template_to_dict(t))
-        self.save()
+        d = self._template_to_dict(t)
+        self._objs[id(d)] = (d, t)
+        self.data["templates"].append(d)
+        self._templates_by_id.setdefault(t.template_id, d)
+        self._changed("templates")
 
     def list_templates(self) -> List[Template]:
-        return [self._dict_to_template(x) for x in self.data["templates"]]
+        return [self._obj(x, self._dict_to_template) for x in self.data["templates"]]
 
     def list_templates_by_teacher(self, teacher: str) -> List[Template]:
-        return [t for t in self.list_templates() if t.created_by == teacher]
+        return [self._obj(x, self._dict_to_template) for x in self.data["templates"] if x.get("created_by", "") == teacher]
 
     def get_template(self, template_id: str) -> Optional[Template]:
-        for t in self.data["templates"]:
-            if t.get("template_id") == template_id:
-                return self._dict_to_template(t)
-        return None
+        t = self._templates_by_id.get(template_id)
+        return self._obj(t, self._dict_to_template) if t is not None else None
 
     def delete_template(self, template_id: str) -> bool:
-        before = len(self.data["templates"])
-        self.data["templates"] = [t for t in self.data["templates"] if t.get("template_id") != template_id]
-        after = len(self.data["templates"])
-        if after == before:
+        t = self._templates_by_id.pop(template_id, None)
+        if t is None:
             return False
-        self.save()
+        self._objs.pop(id(t), None)
+        _remove_same(self.data["templates"], t)
+        self._changed("templates")
         return True
 
     def has_exam_from_template(self, template_id: str) -> bool:
-        return any(e.get("template_id") == template_id for e in self.data["exams"])
+        return self._exams_per_template.get(template_id, 0) > 0
 
     def _template_to_dict(self, t: Template) -> Dict[str, Any]:
         return {
             "template_id": t.template_id,
             "title": t.title,
             "created_by": t.created_by,
-            "questions": [asdict(q) for q in t.questions],
+            "questions": [_question_to_dict(q) for q in t.questions],
         }
 
     def _dict_to_template(self, d: Dict[str, Any]) -> Template:
-        qs = []
-        for q in d.get("questions", []):
-            qs.append(Question(text=q["text"], options=q["options"], correct_indices=q.get("correct_indices", [])))
+        qs = tuple(self._question(q) for q in d.get("questions", []))
         return Template(
             template_id=d.get("template_id", ""),
             title=d.get("title", ""),
@@ -378,37 +750,58 @@ class DataStore:
             questions=qs
         )
 
+    def _question(self, q: Dict[str, Any]) -> Question:
+        """Question for a stored dict; equal questions (an exam and its template, sibling exams) share one object."""
+        key = (q["text"], tuple(q["options"]), tuple(q.get("correct_indices", [])))
+        hit = self._questions.get(key)
+        if hit is None:
+            hit = self._questions[key] = Question(text=key[0], options=key[1], correct_indices=key[2])
+        return hit
+
     # ---- Exams ----
     def add_exam(self, e: Exam):
-        self.data["exams"].append(self._exam_to_dict(e))
-        self.save()
+        d = self._exam_to_dict(e)
+        self._objs[id(d)] = (d, e)
+        self.data["exams"].append(d)
+        self._index_exam(d)
+        self._changed("exams")
 
     def list_exams(self) -> List[Exam]:
-        return [self._dict_to_exam(x) for x in self.data["exams"]]
+        return [self._obj(x, self._dict_to_exam) for x in self.data["exams"]]
 
     def list_exams_by_teacher(self, teacher: str) -> List[Exam]:
-        return [e for e in self.list_exams() if e.created_by == teacher]
+        return [self._obj(x, self._dict_to_exam) for x in self._exams_by_teacher.get(teacher, ())]
 
     def get_exam_by_code(self, code: str) -> Optional[Exam]:
-        code = (code or "").strip().upper()
-        for e in self.data["exams"]:
-            if (e.get("access_code") or "").upper() == code:
-                return self._dict_to_exam(e)
-        return None
+        e = self._exams_by_code.get((code or "").strip().upper())
+        return self._obj(e, self._dict_to_exam) if e is not None else None
 
     def get_exam(self, exam_id: str) -> Optional[Exam]:
-        for e in self.data["exams"]:
-            if e.get("exam_id") == exam_id:
-                return self._dict_to_exam(e)
-        return None
+        e = self._exams_by_id.get(exam_id)
+        return self._obj(e, self._dict_to_exam) if e is not None else None
+
+    def get_exams_by_ids(self, exam_ids: Iterable[str]) -> Dict[str, Exam]:
+        """exam_id -> Exam for the ids that exist (one lookup each, no per-caller loops)."""
+        out: Dict[str, Exam] = {}
+        for exam_id in exam_ids:
+            d = self._exams_by_id.get(exam_id)
+            if d is not None:
+                out[exam_id] = self._obj(d, self._dict_to_exam)
+        return out
 
     def delete_exam(self, exam_id: str) -> bool:
-        before = len(self.data["exams"])
-        self.data["exams"] = [e for e in self.data["exams"] if e.get("exam_id") != exam_id]
-        after = len(self.data["exams"])
-        if after == before:
+        e = self._exams_by_id.pop(exam_id, None)
+        if e is None:
             return False
-        self.save()
+        self._objs.pop(id(e), None)
+        _remove_same(self.data["exams"], e)
+        code = (e.get("access_code") or "").upper()
+        if self._exams_by_code.get(code) is e:
+            del self._exams_by_code[code]
+        tid = e.get("template_id")
+        self._exams_per_template[tid] = self._exams_per_template.get(tid, 1) - 1
+        _remove_same(self._exams_by_teacher.get(e.get("created_by", ""), []), e)
+        self._changed("exams")
         return True
 
     def _exam_to_dict(self, e: Exam) -> Dict[str, Any]:
@@ -419,18 +812,17 @@ class DataStore:
             "created_by": e.created_by,
             "access_code": e.access_code,
             "password": e.password,
+            "password_hash": e.password_hash,
             "duration_seconds": e.duration_seconds,
             "allow_review": e.allow_review,
             "attempt_limit": e.attempt_limit,
             "start_ts": e.start_ts,
             "end_ts": e.end_ts,
-            "questions": [asdict(q) for q in e.questions],
+            "questions": [_question_to_dict(q) for q in e.questions],
         }
 
     def _dict_to_exam(self, d: Dict[str, Any]) -> Exam:
-        qs = []
-        for q in d.get("questions", []):
-            qs.append(Question(text=q["text"], options=q["options"], correct_indices=q.get("correct_indices", [])))
+        qs = tuple(self._question(q) for q in d.get("questions", []))
         return Exam(
             exam_id=d.get("exam_id", ""),
             template_id=d.get("template_id", ""),
@@ -443,116 +835,229 @@ class DataStore:
             attempt_limit=int(d.get("attempt_limit", 0) or 0),
             start_ts=int(d.get("start_ts", 0) or 0),
             end_ts=int(d.get("end_ts", 0) or 0),
-            questions=qs
+            questions=qs,
+            password_hash=d.get("password_hash", "") or "",
         )
 
     # ---- Attempts ----
     def add_attempt(self, a: Attempt):
-        self.data["attempts"].append(asdict(a))
-        self.save()
+        d = _attempt_to_dict(a)
+        if self._attempts_loaded:
+            self._objs[id(d)] = (d, a)
+            self.data["attempts"].append(d)
+            self._index_attempt(d)
+        # otherwise the line below is all there is to do; the next read picks it up from the file
+        fp = self._attempts_handle()
+        fp.write(_json_dumps(d) + b"\n")
+        fp.flush()
 
     def list_attempts_for_user(self, username: str) -> List[Attempt]:
-        out = [Attempt(**x) for x in self.data["attempts"] if x.get("username") == username]
+        self._ensure_attempts()
+        out = [self._obj(x, _attempt_from_dict) for x in self._attempts_by_user.get(username, ())]
         out.sort(key=lambda z: z.submitted_at, reverse=True)
         return out
 
     def list_attempts_for_exam(self, exam_id: str) -> List[Attempt]:
-        out = [Attempt(**x) for x in self.data["attempts"] if x.get("exam_id") == exam_id]
-        out.sort(key=lambda z: z.submitted_at, reverse=True)
-        return out
+        return list(self.iter_attempts_for_exam(exam_id))
+
+    def iter_attempts_for_exam(self, exam_id: str) -> Iterator[Attempt]:
+        """Newest first, built one at a time (for streaming exports)."""
+        self._ensure_attempts()
+        raw = sorted(self._attempts_by_exam.get(exam_id, ()), key=lambda x: x.get("submitted_at", 0), reverse=True)
+        for x in raw:
+            yield self._obj(x, _attempt_from_dict)
 
     def count_attempts_for_user_exam(self, username: str, exam_id: str) -> int:
-        return sum(1 for x in self.data["attempts"] if x.get("username") == username and x.get("exam_id") == exam_id)
+        self._ensure_attempts()
+        return self._attempt_counts.get((username, exam_id), 0)
 
     def delete_attempts_for_exam(self, exam_id: str) -> int:
-        before = len(self.data["attempts"])
-        self.data["attempts"] = [a for a in self.data["attempts"] if a.get("exam_id") != exam_id]
-        after = len(self.data["attempts"])
-        deleted = before - after
-        if deleted:
-            self.save()
-        return deleted
+        self._ensure_attempts()
+        removed = self._attempts_by_exam.pop(exam_id, None)
+        if not removed:
+            return 0
+        gone = {id(x) for x in removed}
+        _drop_ids(self.data["attempts"], gone)
+        users = set()
+        for x in removed:
+            self._objs.pop(id(x), None)
+            users.add(x.get("username"))
+        for name in users:
+            self._attempt_counts.pop((name, exam_id), None)
+        for name in users:
+            _drop_ids(self._attempts_by_user.get(name, []), gone)
+        self._rewrite_attempts()
+        return len(removed)
 
 
 # -----------------------------
 # Export helpers
 # -----------------------------
+# Empty python-docx document as bytes, built on first export (the default template is read from disk once)
+_DOCX_TEMPLATE: Optional[bytes] = None
+
+
+def _new_document():
+    """New empty Document from the cached template bytes."""
+    global _DOCX_TEMPLATE
+    Document = _lazy("docx", "Document")
+    if _DOCX_TEMPLATE is None:
+        buf = io.BytesIO()
+        Document().save(buf)
+        _DOCX_TEMPLATE = buf.getvalue()
+    return Document(io.BytesIO(_DOCX_TEMPLATE))
+
+
+def _add_lines(doc, lines: List[str]):
+    """One paragraph, lines separated by soft breaks (one <w:p> instead of one per line)."""
+    run = doc.add_paragraph().add_run()
+    for n, line in enumerate(lines):
+        if n:
+            run.add_break()
+        run.add_text(line)
+
+
 def export_template_to_word(t: Template, filepath: str, include_answers: bool = True):
-    if Document is None:
+    if _lazy("docx", "Document") is None:
         print("Export needs python-docx. Run: pip install python-docx")
         return
-    doc = Document()
+    doc = _new_document()
     doc.add_heading(f"Template: {t.title}", level=1)
     doc.add_paragraph(f"Template ID: {t.template_id}")
     doc.add_paragraph(f"Created by: {t.created_by}")
     doc.add_paragraph(f"Questions: {len(t.questions)}")
     for i, q in enumerate(t.questions, start=1):
         doc.add_heading(f"Q{i}: {q.text}", level=2)
-        for oi, opt in enumerate(q.options, start=1):
-            doc.add_paragraph(f"{oi}. {opt}", style="List Bullet")
+        _add_lines(doc, [f"{oi}. {opt}" for oi, opt in enumerate(q.options, start=1)])
         if include_answers:
-            correct = ", ".join(str(x + 1) for x in sorted(q.correct_indices))
+            correct = ", ".join(str(x + 1) for x in q.correct_sorted)
             doc.add_paragraph(f"Correct: {correct}")
     doc.save(filepath)
     print(f"Saved: {filepath}")
 
 
 def export_exam_to_word(e: Exam, filepath: str, include_answers: bool = True):
-    if Document is None:
+    if _lazy("docx", "Document") is None:
         print("Export needs python-docx. Run: pip install python-docx")
         return
-    doc = Document()
+    doc = _new_document()
     doc.add_heading(f"Exam: {e.title}", level=1)
     doc.add_paragraph(f"Exam ID: {e.exam_id}")
     doc.add_paragraph(f"Code: {e.access_code}")
     doc.add_paragraph(f"Window: {fmt_dt(e.start_ts)} -> {fmt_dt(e.end_ts)}")
     doc.add_paragraph(f"Duration: {max(1, e.duration_seconds // 60)} minutes")
-    doc.add_paragraph(f"Password: {'set' if e.password else 'none'}")
+    doc.add_paragraph(f"Password: {'set' if (e.password_hash or e.password) else 'none'}")
     doc.add_paragraph(f"Allow review: {'yes' if e.allow_review else 'no'}")
     doc.add_paragraph(f"Attempt limit: {e.attempt_limit} (0=unlimited)")
     doc.add_paragraph(f"From template: {e.template_id}")
     for i, q in enumerate(e.questions, start=1):
         doc.add_heading(f"Q{i}: {q.text}", level=2)
-        for oi, opt in enumerate(q.options, start=1):
-            doc.add_paragraph(f"{oi}. {opt}", style="List Bullet")
+        _add_lines(doc, [f"{oi}. {opt}" for oi, opt in enumerate(q.options, start=1)])
         if include_answers:
-            correct = ", ".join(str(x + 1) for x in sorted(q.correct_indices))
+            correct = ", ".join(str(x + 1) for x in q.correct_sorted)
             doc.add_paragraph(f"Correct: {correct}")
     doc.save(filepath)
     print(f"Saved: {filepath}")
 
 
-def export_exam_results_to_excel(e: Exam, attempts: List[Attempt], filepath: str):
-    if Workbook is None:
-        print("Export needs openpyxl. Run: pip install openpyxl")
-        return
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Results"
-    ws.append([
-        "Exam Title", "Exam ID", "Code",
-        "Username", "Full Name", "Student ID",
-        "Score (/10)", "Raw Score", "Total Questions",
-        "Time Taken (sec)", "Submitted At"
-    ])
-    total_q = max(1, len(e.questions))
-    for a in attempts:
-        score10 = (a.score / max(1, a.total)) * 10.0
-        ws.append([
-            e.title, e.exam_id, e.access_code,
-            a.username, a.full_name, a.student_id,
-            round(score10, 2), round(a.score, 4), a.total,
-            a.time_taken_seconds, fmt_dt_full(a.submitted_at)
-        ])
-    wb.save(filepath)
+RESULT_HEADER = [
+    "Exam Title", "Exam ID", "Code",
+    "Username", "Full Name", "Student ID",
+    "Score (/10)", "Raw Score", "Total Questions",
+    "Time Taken (sec)", "Submitted At"
+]
+
+
+def _result_rows(e: Exam, attempts: Iterable[Attempt], chunk: int = 1000) -> Iterator[List[Any]]:
+    """Results rows, graded a chunk at a time so a generator of attempts is never fully materialized.
+    Attempts without an answer per question (older records) keep their stored score."""
+    nq = len(e.questions)
+    it = iter(attempts)
+    while True:
+        part = list(itertools.islice(it, chunk))
+        if not part:
+            return
+        for a, graded in zip(part, grade_attempts(e, part)):
+            raw = graded if len(a.answers or ()) >= nq else a.score
+            yield [
+                e.title, e.exam_id, e.access_code,
+                a.username, a.full_name, a.student_id,
+                round((raw / max(1, a.total)) * 10.0, 2), round(raw, 4), a.total,
+                a.time_taken_seconds, fmt_dt_full(a.submitted_at)
+            ]
+
+
+def _write_results_file(filepath: str, rows: Iterable[List[Any]]):
+    # preferred when installed: constant_memory mode streams rows to disk
+    xlsxwriter = _lazy("xlsxwriter")
+    if xlsxwriter is not None:
+        # constant_memory: each row is flushed to disk as soon as the next one starts
+        wb = xlsxwriter.Workbook(filepath, {"constant_memory": True})
+        ws = wb.add_worksheet("Results")
+        ws.write_row(0, 0, RESULT_HEADER)
+        for r, row in enumerate(rows, start=1):
+            ws.write_row(r, 0, row)
+        wb.close()
+    else:
+        # write-only: rows are streamed to the file instead of kept as Cell objects
+        wb = _lazy("openpyxl", "Workbook")(write_only=True)
+        ws = wb.create_sheet("Results")
+        ws.append(RESULT_HEADER)
+        for row in rows:
+            ws.append(row)
+        wb.save(filepath)
+
+
+def export_exam_results_to_csv(e: Exam, attempts: Iterable[Attempt], filepath: str):
+    """Same rows as the Excel export, streamed with csv.writer (no extra libs, no row limit)."""
+    # utf-8-sig so Excel opens Vietnamese names correctly when the .csv is double-clicked
+    with open(filepath, "w", newline="", encoding="utf-8-sig", buffering=1 << 16) as f:
+        w = csv.writer(f)
+        w.writerow(RESULT_HEADER)
+        w.writerows(_result_rows(e, attempts))
     print(f"Saved: {filepath}")
 
 
+def _part_path(filepath: str, n: int) -> str:
+    root, ext = os.path.splitext(filepath)
+    return f"{root}_part{n:02d}{ext or '.xlsx'}"
+
+
+def export_exam_results_to_excel(e: Exam, attempts: Iterable[Attempt], filepath: str, segment_size: int = 0):
+    """segment_size > 0 rolls over to name_partNN.xlsx every segment_size rows (+ name_index.txt)."""
+    if _lazy("xlsxwriter") is None and _lazy("openpyxl", "Workbook") is None:
+        print("Export needs openpyxl (or xlsxwriter). Run: pip install openpyxl")
+        return
+    rows = _result_rows(e, attempts)
+    parts: List[str] = []
+    while True:
+        first = next(rows, None)
+        if first is None and parts:
+            break
+        head = [first] if first is not None else []
+        body = itertools.islice(rows, segment_size - 1) if segment_size > 0 else rows
+        path = filepath if not parts else _part_path(filepath, len(parts) + 1)
+        _write_results_file(path, itertools.chain(head, body))
+        parts.append(path)
+        if segment_size <= 0 or first is None:
+            break
+    if len(parts) > 1:
+        # only now do we know it did not fit in one file
+        parts[0] = _part_path(filepath, 1)
+        os.replace(filepath, parts[0])
+        index_path = os.path.splitext(filepath)[0] + "_index.txt"
+        with open(index_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(os.path.basename(x) for x in parts) + "\n")
+        print(f"Saved {len(parts)} files (up to {segment_size} rows each), listed in: {index_path}")
+    else:
+        print(f"Saved: {filepath}")
+
+
 def export_attempt_to_word(e: Exam, a: Attempt, filepath: str):
-    if Document is None:
+    if _lazy("docx", "Document") is None:
         print("Export needs python-docx. Run: pip install python-docx")
         return
-    doc = Document()
+    doc = _new_document()
     doc.add_heading("Attempt Report", level=1)
     doc.add_paragraph(f"Exam: {e.title}")
     doc.add_paragraph(f"Exam ID: {e.exam_id} | Code: {e.access_code}")
@@ -568,17 +1073,18 @@ def export_attempt_to_word(e: Exam, a: Attempt, filepath: str):
     answers = a.answers or []
     points_per_q = 10.0 / total_q
     for i, q in enumerate(e.questions):
-        user_sel = set(answers[i]) if i < len(answers) else set()
-        correct = set(q.correct_indices)
-        earned, missing, extra = score_question_partial(user_sel, correct, points=points_per_q)
+        sel = to_mask(answers[i]) if i < len(answers) else 0
+        cm = q.correct_mask
+        earned = score_mask_partial(sel, cm, points_per_q)
+        missing, extra = mask_diff(sel, cm)
         doc.add_heading(f"Q{i+1}: {q.text}", level=2)
         doc.add_paragraph(f"Earned: {earned:.2f}/{points_per_q:.2f}")
-        for oi, opt in enumerate(q.options, start=1):
-            mu = "[x]" if (oi - 1) in user_sel else "[ ]"
-            mc = "(correct)" if (oi - 1) in correct else ""
-            doc.add_paragraph(f"{mu} {oi}. {opt} {mc}")
-        doc.add_paragraph("Missing correct: " + (", ".join(str(x+1) for x in sorted(missing)) if missing else "none"))
-        doc.add_paragraph("Extra wrong: " + (", ".join(str(x+1) for x in sorted(extra)) if extra else "none"))
+        _add_lines(doc, [
+            f"{'[x]' if sel >> oi & 1 else '[ ]'} {oi + 1}. {opt} {'(correct)' if cm >> oi & 1 else ''}"
+            for oi, opt in enumerate(q.options)
+        ])
+        doc.add_paragraph("Missing correct: " + mask_str(missing))
+        doc.add_paragraph("Extra wrong: " + mask_str(extra))
     doc.save(filepath)
     print(f"Saved: {filepath}")
 
@@ -594,6 +1100,26 @@ def ask(prompt: str) -> str:
     return input(prompt).strip()
 
 
+def input_interruptible() -> bool:
+    """True when ask_until can give up mid-input: select() on stdin needs POSIX,
+    and a piped stdin may already hold buffered lines that select() cannot see."""
+    return os.name != "nt" and sys.stdin.isatty()
+
+
+def ask_until(prompt: str, stop: threading.Event) -> Optional[str]:
+    """Like ask(), but gives up and returns None once stop is set.
+    Falls back to a plain blocking ask() when input_interruptible() is False."""
+    if not input_interruptible():
+        return ask(prompt)
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    while not stop.is_set():
+        ready, _, _ = select.select([sys.stdin], [], [], 0.2)
+        if ready:
+            return sys.stdin.readline().strip()
+    return None
+
+
 def ask_non_empty(prompt: str) -> str:
     while True:
         s = ask(prompt)
@@ -616,6 +1142,27 @@ def ask_int(prompt: str, min_v: int, max_v: int) -> int:
         return v
 
 
+SEGMENT_SIZES = [100_000, 250_000, 500_000, 1_000_000]
+
+
+def ask_segment_size(default: int = 250_000) -> int:
+    """Rows per Excel file for big exports (Excel itself stops at ~1M rows per sheet)."""
+    opts = "/".join(str(x) for x in SEGMENT_SIZES)
+    while True:
+        s = ask(f"Rows per file ({opts}) [{default}]: ").replace("_", "").replace(",", "")
+        if not s:
+            return default
+        try:
+            v = int(s)
+        except Exception:
+            print("Please enter an integer.")
+            continue
+        if v not in SEGMENT_SIZES:
+            print(f"Choose one of: {opts}")
+            continue
+        return v
+
+
 def ask_yes_no(prompt: str, default: bool = False) -> bool:
     suffix = " [Y/n] " if default else " [y/N] "
     s = ask(prompt + suffix).lower()
@@ -644,7 +1191,7 @@ def ask_dob(prompt: str = "DOB") -> str:
         print("Invalid date. Month must be 1..12, day must be valid for the month.")
 
 
-def ask_multi_choice(max_opt: int = 4) -> Set[int]:
+def ask_multi_choice(max_opt: int = 4, stop: Optional[threading.Event] = None) -> Set[int]:
     """
     Return 0-based indices.
     Input examples:
@@ -652,8 +1199,10 @@ def ask_multi_choice(max_opt: int = 4) -> Set[int]:
       1 3
       1,3,4
       blank -> empty
+    If stop is given and gets set while waiting, returns empty.
     """
-    s = ask("Your answer (e.g. 2 or 1 3). Blank to skip: ").strip()
+    prompt = "Your answer (e.g. 2 or 1 3). Blank to skip: "
+    s = ask(prompt) if stop is None else ask_until(prompt, stop)
     if not s:
         return set()
     parts = s.replace(",", " ").split()
@@ -668,6 +1217,34 @@ def ask_multi_choice(max_opt: int = 4) -> Set[int]:
     return out
 
 
+def write_lines(lines: List[str]):
+    """Print many lines with a single write (one syscall instead of one per print())."""
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+
+PAGE_SIZE = 20  # rows per screen in the long listings (my exams / my attempts)
+
+
+def page_info(offset: int, total: int) -> Tuple[str, str]:
+    """(page line, nav options) for a listing; both empty when it fits on one page."""
+    if total <= PAGE_SIZE:
+        return "", ""
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    return (f"-- page {offset // PAGE_SIZE + 1}/{pages} ({total} items) --",
+            "n) Next page  b) Prev page  ")
+
+
+def page_move(act: str, offset: int, total: int) -> Optional[int]:
+    """New offset for 'n'/'b' (clamped to the list), None for any other action."""
+    if act == "n":
+        return offset + PAGE_SIZE if offset + PAGE_SIZE < total else offset
+    if act == "b":
+        return max(0, offset - PAGE_SIZE)
+    return None
+
+
 def print_header(title: str, subtitle: str = ""):
     print("=" * 70)
     print(title)
@@ -827,7 +1404,7 @@ def teacher_create_template(store: DataStore, me: User):
         if not ask_yes_no("Add another question?", default=True):
             break
 
-    t = Template(template_id=store.new_template_id(), title=title, created_by=me.username, questions=qs)
+    t = Template(template_id=store.new_template_id(), title=title, created_by=me.username, questions=tuple(qs))
     store.add_template(t)
     print(f"Template saved. ID: {t.template_id} | Questions: {len(qs)}")
     pause()
@@ -858,10 +1435,11 @@ def teacher_list_templates(store: DataStore, me: User):
             for qi, q in enumerate(t.questions, start=1):
                 print("-" * 70)
                 print(f"Q{qi}: {q.text}")
-                for oi, opt in enumerate(q.options, start=1):
-                    mark = " (correct)" if (oi - 1) in set(q.correct_indices) else ""
-                    print(f"  {oi}. {opt}{mark}")
-                print("Correct:", ", ".join(str(x + 1) for x in sorted(q.correct_indices)))
+                cm = q.correct_mask
+                for oi, opt in enumerate(q.options):
+                    mark = " (correct)" if cm >> oi & 1 else ""
+                    print(f"  {oi + 1}. {opt}{mark}")
+                print("Correct:", ", ".join(str(x + 1) for x in q.correct_sorted))
             pause()
         elif act == "d":
             if store.has_exam_from_template(t.template_id):
@@ -905,9 +1483,9 @@ def teacher_publish_exam(store: DataStore, me: User):
     allow_review = ask_yes_no("Allow review after submit?", default=False)
 
     use_pass = ask_yes_no("Use password for this exam?", default=False)
-    password = ""
+    password_hash = ""
     if use_pass:
-        password = ask_non_empty("Exam password: ")
+        password_hash = hash_exam_password(ask_non_empty("Exam password: "))
 
     code = store.new_unique_code(8)
     e = Exam(
@@ -916,13 +1494,14 @@ def teacher_publish_exam(store: DataStore, me: User):
         title=tpl.title,
         created_by=me.username,
         access_code=code,
-        password=password,
+        password="",
+        password_hash=password_hash,
         duration_seconds=dur_min * 60,
         allow_review=allow_review,
         attempt_limit=attempt_limit,
         start_ts=int(start_ts),
         end_ts=int(end_ts),
-        questions=list(tpl.questions),
+        questions=tpl.questions,
     )
     store.add_exam(e)
     print(f"Published exam OK. CODE: {e.access_code} | Exam ID: {e.exam_id}")
@@ -930,27 +1509,45 @@ def teacher_publish_exam(store: DataStore, me: User):
 
 
 def teacher_list_exams(store: DataStore, me: User):
+    my: Optional[List[Exam]] = None
+    # exam_id -> static tail of the listing line (window/duration/limit); only status depends on now
+    tails: Dict[str, str] = {}
+    offset = 0
     while True:
         clear_screen()
         now = int(time.time())
-        my = store.list_exams_by_teacher(me.username)
+        if my is None:
+            my = store.list_exams_by_teacher(me.username)
+            offset = min(offset, max(0, len(my) - 1) // PAGE_SIZE * PAGE_SIZE)
         print_header("My Exams")
         if not my:
             print("(No exams yet)")
             pause()
             return
 
-        for i, e in enumerate(my, start=1):
+        page = my[offset:offset + PAGE_SIZE]
+        for i, e in enumerate(page, start=offset + 1):
             status = "OPEN" if (e.start_ts <= now <= e.end_ts) else ("WAIT" if now < e.start_ts else "CLOSED")
-            mins = max(1, e.duration_seconds // 60)
-            print(f"{i}) {e.exam_id} | {e.title} | code:{e.access_code} | {status} | {fmt_dt(e.start_ts)} -> {fmt_dt(e.end_ts)} | {mins} min | limit:{e.attempt_limit}")
+            tail = tails.get(e.exam_id)
+            if tail is None:
+                mins = max(1, e.duration_seconds // 60)
+                tail = tails[e.exam_id] = f"{fmt_dt(e.start_ts)} -> {fmt_dt(e.end_ts)} | {mins} min | limit:{e.attempt_limit}"
+            print(f"{i}) {e.exam_id} | {e.title} | code:{e.access_code} | {status} | {tail}")
+        page_line, nav = page_info(offset, len(my))
+        if page_line:
+            print(page_line)
 
         print("\nOptions:")
-        print("p) Preview  a) Attempts/results  w) Export Word  x) Export Excel  d) Delete exam  r) Delete attempts  0) Back")
+        print("p) Preview  a) Attempts/results  w) Export Word  x) Export results  d) Delete exam  r) Delete attempts")
+        print(f"{nav}0) Back")
         act = ask("Choose action: ").lower()
         if act == "0":
             return
-        idx = ask_int("Exam number: ", 1, len(my)) - 1
+        moved = page_move(act, offset, len(my)) if nav else None
+        if moved is not None:
+            offset = moved
+            continue
+        idx = ask_int("Exam number: ", offset + 1, offset + len(page)) - 1
         e = my[idx]
 
         if act == "p":
@@ -963,13 +1560,23 @@ def teacher_list_exams(store: DataStore, me: User):
             export_exam_to_word(e, filepath, include_answers=include_ans)
             pause()
         elif act == "x":
-            filepath = ask_non_empty("Output .xlsx path (example: results.xlsx): ")
-            attempts = store.list_attempts_for_exam(e.exam_id)
-            export_exam_results_to_excel(e, attempts, filepath)
+            fmt = ask("Format (csv/xlsx) [csv]: ").lower() or "csv"
+            if fmt not in ("csv", "xlsx"):
+                print("Unknown format.")
+            elif fmt == "csv":
+                filepath = ask_non_empty("Output .csv path (example: results.csv): ")
+                export_exam_results_to_csv(e, store.iter_attempts_for_exam(e.exam_id), filepath)
+            else:
+                filepath = ask_non_empty("Output .xlsx path (example: results.xlsx): ")
+                seg = ask_segment_size()
+                export_exam_results_to_excel(e, store.iter_attempts_for_exam(e.exam_id), filepath, segment_size=seg)
             pause()
         elif act == "d":
             if ask_yes_no(f"Delete exam '{e.title}' (attempts will remain)?", default=False):
                 ok = store.delete_exam(e.exam_id)
+                if ok:
+                    my = None
+                    tails.pop(e.exam_id, None)
                 print("Deleted." if ok else "Delete failed.")
                 pause()
         elif act == "r":
@@ -987,34 +1594,39 @@ def teacher_preview_exam(e: Exam):
     print_header(f"Exam Preview: {e.title}", f"id:{e.exam_id} | code:{e.access_code}")
     print(f"Window: {fmt_dt(e.start_ts)} -> {fmt_dt(e.end_ts)}")
     print(f"Duration: {max(1, e.duration_seconds // 60)} minutes")
-    print(f"Password: {'set' if e.password else 'none'}")
+    print(f"Password: {'set' if (e.password_hash or e.password) else 'none'}")
     print(f"Allow review: {'yes' if e.allow_review else 'no'}")
     print(f"Attempt limit: {e.attempt_limit} (0=unlimited)")
     print(f"From template: {e.template_id}")
+    out: List[str] = []
     for i, q in enumerate(e.questions, start=1):
-        print("-" * 70)
-        print(f"Q{i}: {q.text}")
-        for oi, opt in enumerate(q.options, start=1):
-            mark = " (correct)" if (oi - 1) in set(q.correct_indices) else ""
-            print(f"  {oi}. {opt}{mark}")
+        out.append("-" * 70)
+        out.append(f"Q{i}: {q.text}")
+        cm = q.correct_mask
+        for oi, opt in enumerate(q.options):
+            mark = " (correct)" if cm >> oi & 1 else ""
+            out.append(f"  {oi + 1}. {opt}{mark}")
+    write_lines(out)
     pause()
 
 
 def teacher_exam_attempts_menu(store: DataStore, e: Exam):
+    # nothing in this menu adds/deletes attempts, so fetch (from the per-exam index) and format once
+    attempts = store.list_attempts_for_exam(e.exam_id)
+    lines = []
+    for i, a in enumerate(attempts, start=1):
+        score10 = (a.score / max(1, a.total)) * 10.0
+        took = f"{a.time_taken_seconds // 60:02d}:{a.time_taken_seconds % 60:02d}"
+        lines.append(f"{i}) {a.full_name or '(no name)'} | {a.username} | {score10:.2f}/10 | took {took} | {fmt_dt_full(a.submitted_at)}")
     while True:
         clear_screen()
-        attempts = store.list_attempts_for_exam(e.exam_id)
         print_header("Attempts / Results", f"{e.title} | code:{e.access_code}")
         if not attempts:
             print("(No attempts yet)")
             pause()
             return
 
-        total_q = max(1, len(e.questions))
-        for i, a in enumerate(attempts, start=1):
-            score10 = (a.score / max(1, a.total)) * 10.0
-            took = f"{a.time_taken_seconds // 60:02d}:{a.time_taken_seconds % 60:02d}"
-            print(f"{i}) {a.full_name or '(no name)'} | {a.username} | {score10:.2f}/10 | took {took} | {fmt_dt_full(a.submitted_at)}")
+        print("\n".join(lines))
 
         print("\nOptions:")
         print("v) View details  w) Export attempt Word  0) Back")
@@ -1034,6 +1646,28 @@ def teacher_exam_attempts_menu(store: DataStore, e: Exam):
             pause()
 
 
+def _review_lines(e: Exam, answers: List[List[int]], points_per_q: float) -> List[str]:
+    """Per-question review block shared by the teacher and student views."""
+    out: List[str] = []
+    rule = "-" * 70
+    points_str = f"{points_per_q:.2f}"
+    for i, q in enumerate(e.questions):
+        sel = to_mask(answers[i]) if i < len(answers) else 0
+        cm = q.correct_mask
+        earned = score_mask_partial(sel, cm, points_per_q)
+        missing, extra = mask_diff(sel, cm)
+        out.append(rule)
+        out.append(f"Q{i+1}: {q.text}")
+        out.append(f"Earned: {earned:.2f}/{points_str}")
+        for oi, opt in enumerate(q.options):
+            mu = "[x]" if sel >> oi & 1 else "[ ]"
+            mc = " (correct)" if cm >> oi & 1 else ""
+            out.append(f"  {mu} {oi + 1}. {opt}{mc}")
+        out.append("Missing correct: " + mask_str(missing))
+        out.append("Extra wrong: " + mask_str(extra))
+    return out
+
+
 def teacher_view_attempt_details(e: Exam, a: Attempt):
     clear_screen()
     total_q = max(1, len(e.questions))
@@ -1045,19 +1679,7 @@ def teacher_view_attempt_details(e: Exam, a: Attempt):
     points_per_q = 10.0 / total_q
     answers = a.answers or []
 
-    for i, q in enumerate(e.questions):
-        user_sel = set(answers[i]) if i < len(answers) else set()
-        correct = set(q.correct_indices)
-        earned, missing, extra = score_question_partial(user_sel, correct, points=points_per_q)
-        print("-" * 70)
-        print(f"Q{i+1}: {q.text}")
-        print(f"Earned: {earned:.2f}/{points_per_q:.2f}")
-        for oi, opt in enumerate(q.options, start=1):
-            mu = "[x]" if (oi - 1) in user_sel else "[ ]"
-            mc = " (correct)" if (oi - 1) in correct else ""
-            print(f"  {mu} {oi}. {opt}{mc}")
-        print("Missing correct:", (", ".join(str(x + 1) for x in sorted(missing)) if missing else "none"))
-        print("Extra wrong:", (", ".join(str(x + 1) for x in sorted(extra)) if extra else "none"))
+    write_lines(_review_lines(e, answers, points_per_q))
     pause()
 
 
@@ -1076,8 +1698,7 @@ def student_menu(store: DataStore, me: User):
         if c == "0":
             return
         if c == "1":
-            student_update_profile(store, me)
-            me = store.find_user(me.username) or me
+            me = student_update_profile(store, me)
         elif c == "2":
             student_enter_exam(store, me)
         elif c == "3":
@@ -1087,10 +1708,11 @@ def student_menu(store: DataStore, me: User):
             pause()
 
 
-def student_update_profile(store: DataStore, me: User):
+def student_update_profile(store: DataStore, me: User) -> User:
+    """Returns the (possibly updated) user; student_menu keeps using it as `me`."""
     clear_screen()
     print_header("Update Profile", "Leave blank to keep current value.")
-    cur = store.find_user(me.username) or me
+    cur = me
     full_name = ask(f"Full name [{cur.full_name}]: ")
     dob = ask(f"DOB [{cur.dob}] (YYYY-MM-DD): ")
     sid = ask(f"Student ID [{cur.student_id}]: ")
@@ -1103,20 +1725,25 @@ def student_update_profile(store: DataStore, me: User):
         if not is_valid_date_yyyy_mm_dd(dob):
             print("Invalid DOB. Update canceled.")
             pause()
-            return
+            return me
     if not sid:
         sid = cur.student_id
 
     ok = store.update_profile(me.username, full_name, dob, sid)
     print("Updated." if ok else "Update failed.")
     pause()
+    return (store.find_user(me.username) or me) if ok else me
 
 
 def _check_exam_password(exam: Exam) -> bool:
-    if not exam.password:
+    if not (exam.password_hash or exam.password):
         return True
     pw = ask("Exam password: ")
-    if pw != exam.password:
+    if exam.password_hash:
+        ok = hmac.compare_digest(hash_exam_password(pw), exam.password_hash)
+    else:
+        ok = hmac.compare_digest(pw.encode("utf-8"), exam.password.encode("utf-8"))
+    if not ok:
         print("Password is not correct.")
         pause()
         return False
@@ -1161,37 +1788,50 @@ def student_take_exam(store: DataStore, me: User, exam: Exam):
     mins = max(1, exam.duration_seconds // 60)
     print_header("Take Exam", f"{exam.title} | code:{exam.access_code} | {mins} min")
     print("Rule: for multi-correct questions, partial credit may apply.")
-    print("Note: Console demo checks time only at each question input.\n")
+    if input_interruptible():
+        print("Note: the exam is submitted automatically when time runs out.\n")
+    else:
+        print("Note: Console demo checks time only at each question input.\n")
 
     answers: List[Set[int]] = [set() for _ in range(len(exam.questions))]
     started_at = time.time()
     end_time = started_at + exam.duration_seconds
-
-    for i, q in enumerate(exam.questions):
+    # fires even while the student is still reading/typing; the answer prompt gives up when it does
+    time_up = threading.Event()
+    timer = threading.Timer(max(0, exam.duration_seconds), time_up.set)
+    timer.daemon = True
+    timer.start()
+    # question text + options never change during the session: format them once, emit one write per screen
+    nq = len(exam.questions)
+    rule = "=" * 70
+    q_blocks = [
+        "\n".join([q.text] + [f"  {oi}. {opt}" for oi, opt in enumerate(q.options, start=1)])
+        for q in exam.questions
+    ]
+
+    for i in range(nq):
         clear_screen()
         left = int(end_time - time.time())
-        if left <= 0:
+        if time_up.is_set() or left <= 0:
             print("Time is over. Auto submit now.")
             break
 
         mm, ss = max(0, left) // 60, max(0, left) % 60
-        print_header("Take Exam", f"Time left: {mm:02d}:{ss:02d} | Q{i+1}/{len(exam.questions)}")
-        print(q.text)
-        for oi, opt in enumerate(q.options, start=1):
-            print(f"  {oi}. {opt}")
-        answers[i] = ask_multi_choice(4)
+        write_lines([rule, "Take Exam", f"Time left: {mm:02d}:{ss:02d} | Q{i+1}/{nq}", rule, q_blocks[i]])
+        answers[i] = ask_multi_choice(4, stop=time_up)
+        if time_up.is_set():
+            print("\nTime is over. Auto submit now.")
+            break
+    timer.cancel()
 
     submitted_at = time.time()
     time_taken = int(max(0, submitted_at - started_at))
 
     total_q = max(1, len(exam.questions))
-    total_score = 0.0
-    for ans, q in zip(answers, exam.questions):
-        earned, _, _ = score_question_partial(ans, set(q.correct_indices), points=1.0)
-        total_score += earned
+    total_score = sum(score_question_earned(ans, q) for ans, q in zip(answers, exam.questions))
 
-    # refresh user profile data
-    u = store.find_user(me.username) or me
+    # me is kept current by student_menu (refreshed after a profile update)
+    u = me
 
     a = Attempt(
         attempt_id=store.new_attempt_id(),
@@ -1206,7 +1846,7 @@ def student_take_exam(store: DataStore, me: User, exam: Exam):
         started_at=started_at,
         submitted_at=submitted_at,
         time_taken_seconds=time_taken,
-        answers=[sorted(list(s)) for s in answers],
+        answers=[sorted(s) for s in answers],
     )
     store.add_attempt(a)
 
@@ -1220,31 +1860,53 @@ def student_take_exam(store: DataStore, me: User, exam: Exam):
 
 
 def student_my_attempts(store: DataStore, me: User):
+    # nothing in this menu changes attempts or exams, so fetch once and keep formatted pages
+    attempts = store.list_attempts_for_user(me.username)
+    exams_by_id = store.get_exams_by_ids({a.exam_id for a in attempts})
+    can_review = any(ex.allow_review for ex in exams_by_id.values())
+    pages: Dict[int, List[str]] = {}  # page offset -> listing lines
+    offset = 0
     while True:
         clear_screen()
-        attempts = store.list_attempts_for_user(me.username)
         print_header("My Attempts")
         if not attempts:
             print("No attempts yet.")
             pause()
             return
 
-        for i, a in enumerate(attempts, start=1):
-            score10 = (a.score / max(1, a.total)) * 10.0
-            print(f"{i}) {fmt_dt_full(a.submitted_at)} | {a.title} | code:{a.code} | {score10:.2f}/10")
+        lines = pages.get(offset)
+        if lines is None:
+            lines = pages[offset] = []
+            for i, a in enumerate(attempts[offset:offset + PAGE_SIZE], start=offset + 1):
+                score10 = (a.score / max(1, a.total)) * 10.0
+                ex = exams_by_id.get(a.exam_id)
+                tag = " | review" if ex is not None and ex.allow_review else ""
+                lines.append(f"{i}) {fmt_dt_full(a.submitted_at)} | {a.title} | code:{a.code} | {score10:.2f}/10{tag}")
+            page_line, _ = page_info(offset, len(attempts))
+            if page_line:
+                lines.append(page_line)
+        write_lines(lines)
+        _, nav = page_info(offset, len(attempts))
 
         print("\nOptions:")
-        print("r) Review attempt (if allowed)  0) Back")
+        if can_review:
+            print(f"r) Review attempt (marked 'review')  {nav}0) Back")
+        else:
+            print(f"{nav}0) Back")
         act = ask("Choose: ").lower()
         if act == "0":
             return
+        moved = page_move(act, offset, len(attempts)) if nav else None
+        if moved is not None:
+            offset = moved
+            continue
         if act != "r":
             print("Unknown action.")
             pause()
             continue
-        idx = ask_int("Attempt number: ", 1, len(attempts)) - 1
+        idx = ask_int("Attempt number: ", offset + 1, min(offset + PAGE_SIZE, len(attempts))) - 1
         attempt = attempts[idx]
-        exam = store.get_exam(attempt.exam_id)
+        exam = exams_by_id.get(attempt.exam_id)
         if not exam:
             print("Exam data not found.")
             pause()
@@ -1266,19 +1928,7 @@ def student_review_attempt(exam: Exam, attempt: Attempt):
     points_per_q = 10.0 / total_q
     answers = attempt.answers or []
 
-    for i, q in enumerate(exam.questions):
-        user_sel = set(answers[i]) if i < len(answers) else set()
-        correct = set(q.correct_indices)
-        earned, missing, extra = score_question_partial(user_sel, correct, points=points_per_q)
-        print("-" * 70)
-        print(f"Q{i+1}: {q.text}")
-        print(f"Earned: {earned:.2f}/{points_per_q:.2f}")
-        for oi, opt in enumerate(q.options, start=1):
-            mu = "[x]" if (oi - 1) in user_sel else "[ ]"
-            mc = " (correct)" if (oi - 1) in correct else ""
-            print(f"  {mu} {oi}. {opt}{mc}")
-        print("Missing correct:", (", ".join(str(x + 1) for x in sorted(missing)) if missing else "none"))
-        print("Extra wrong:", (", ".join(str(x + 1) for x in sorted(extra)) if extra else "none"))
+    write_lines(_review_lines(exam, answers, points_per_q))
     pause()
 
 